@@ -0,0 +1,209 @@
+"""bench/db_profiles.py — профили хранения SQLite под смешанной нагрузкой
+
+Сравнивает DB_PROFILE=legacy (rollback-журнал, общий пул) и wal (WAL,
+один пишущий + пул читающих соединений). Для каждого профиля берётся
+свежая копия синтетической БД (bench/generate.py) и запускаются
+--procs процессов — как воркеры supervisor.py, — в каждом --readers
+задач читают (calc_stats за 7 дней, рейтинг друзей, страница еды) и
+--writers задач пишут приём пищи так же, как хендлер (Meal + bump
+DailyTotals в одной транзакции), --seconds секунд подряд.
+
+    python -m bench.db_profiles --preset S --procs 4 --readers 8 --writers 2
+
+Отчёт: операций в секунду, p50/p99 чтения и записи, число ошибок
+(«database is locked» и прочие OperationalError).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench.generate import PRESETS, db_path, generate
+
+PROFILES = ("legacy", "wal")
+
+
+# ─────────────────────── нагрузка в дочернем процессе ───────────────────────
+async def _load(readers: int, writers: int, seconds: float, seed: int) -> dict:
+    from datetime import timedelta
+
+    from sqlalchemy import func
+    from sqlalchemy.exc import OperationalError
+    from sqlmodel import select
+
+    from models_and_db import (
+        async_engine,
+        get_async_session,
+        get_read_session,
+        read_engine,
+        Meal,
+        User,
+    )
+    from services import leaderboard as lb
+    from services import stats
+    from services.paging import seek_page
+    from services.rollup import bump
+
+    rng = random.Random(seed)
+    async with get_read_session() as s:
+        users = (await s.exec(select(User).limit(2000))).all()
+        anchor = (await s.exec(select(func.max(Meal.created_at)))).one()
+
+    async def read_once() -> None:
+        user = rng.choice(users)
+        kind = rng.randrange(3)
+        if kind == 0:
+            stats.invalidate_stats(user.id)
+            await stats.calc_stats(user, anchor - timedelta(days=7), anchor)
+        elif kind == 1:
+            lb._cache.pop(user.id)
+            await lb.leaderboard(user.id)
+        else:
+            async with get_read_session() as s:
+                await seek_page(
+                    s,
+                    stats.meal_rows_stmt(user.id, anchor - timedelta(days=30), anchor),
+                    [Meal.created_at, Meal.id],
+                    size=15,
+                )
+
+    async def write_once() -> None:
+        user = rng.choice(users)
+        async with get_async_session() as s:
+            meal = Meal(
+                user_id=user.id,
+                created_at=anchor,
+                raw_text="bench",
+                description="bench",
+                calories=rng.randint(50, 900),
+            )
+            s.add(meal)
+            await bump(s, user.id, meal.created_at, kcal_in=meal.calories)
+            await s.commit()
+
+    timings: dict[str, list[float]] = {"read": [], "write": []}
+    errors: dict[str, int] = {}
+    deadline = time.monotonic() + seconds
+
+    async def loop(kind: str, op) -> None:
+        while time.monotonic() < deadline:
+            t0 = time.perf_counter()
+            try:
+                await op()
+            except OperationalError as e:
+                msg = str(e.orig)
+                errors[msg] = errors.get(msg, 0) + 1
+                continue
+            timings[kind].append((time.perf_counter() - t0) * 1000)
+
+    await asyncio.gather(
+        *(loop("read", read_once) for _ in range(readers)),
+        *(loop("write", write_once) for _ in range(writers)),
+    )
+    await async_engine.dispose()
+    await read_engine.dispose()
+    return {"timings": timings, "errors": errors}
+
+
+def _child(readers: int, writers: int, seconds: float, seed: int) -> None:
+    print(json.dumps(asyncio.run(_load(readers, writers, seconds, seed))))
+
+
+# ─────────────────────── оркестрация ───────────────────────
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_profile(profile: str, source: Path, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / "bench.db"
+        shutil.copy(source, db)
+        env = {
+            **os.environ,
+            "DB_PATH": str(db),
+            "DB_PROFILE": profile,
+            "BOT_TOKEN": os.environ.get("BOT_TOKEN", "0:bench"),
+            "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "bench"),
+            "SLOW_QUERY_MS": "0",
+        }
+        cmd = [
+            sys.executable, "-m", "bench.db_profiles", "--child",
+            "--readers", str(args.readers), "--writers", str(args.writers),
+            "--seconds", str(args.seconds),
+        ]
+        procs = [
+            subprocess.Popen(cmd + ["--seed", str(args.seed + i)], env=env, stdout=subprocess.PIPE, text=True)
+            for i in range(args.procs)
+        ]
+        outputs = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in procs]
+
+    reads = [t for o in outputs for t in o["timings"]["read"]]
+    writes = [t for o in outputs for t in o["timings"]["write"]]
+    errors: dict[str, int] = {}
+    for o in outputs:
+        for msg, n in o["errors"].items():
+            errors[msg] = errors.get(msg, 0) + n
+    return {
+        "profile": profile,
+        "reads_per_s": round(len(reads) / args.seconds, 1),
+        "read_p50_ms": round(_percentile(reads, 0.5), 2),
+        "read_p99_ms": round(_percentile(reads, 0.99), 2),
+        "writes_per_s": round(len(writes) / args.seconds, 1),
+        "write_p50_ms": round(_percentile(writes, 0.5), 2),
+        "write_p99_ms": round(_percentile(writes, 0.99), 2),
+        "write_mean_ms": round(statistics.fmean(writes), 2) if writes else 0.0,
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--preset", choices=PRESETS, default="S")
+    ap.add_argument("--profiles", nargs="+", choices=PROFILES, default=list(PROFILES))
+    ap.add_argument("--procs", type=int, default=2)
+    ap.add_argument("--readers", type=int, default=8)
+    ap.add_argument("--writers", type=int, default=2)
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        _child(args.readers, args.writers, args.seconds, args.seed)
+        return
+
+    source = db_path(args.preset)
+    if not source.exists():
+        print(f"generating {source}…", file=sys.stderr)
+        generate(source, *PRESETS[args.preset], seed=args.seed)
+
+    print(
+        f"{args.procs} procs × ({args.readers} readers + {args.writers} writers), "
+        f"{args.seconds:g} s, dataset {args.preset}\n"
+    )
+    print(f"{'profile':<8} {'reads/s':>8} {'r p50':>7} {'r p99':>8} {'writes/s':>9} {'w p50':>7} {'w p99':>8}  errors")
+    for profile in args.profiles:
+        r = run_profile(profile, source, args)
+        errors = ", ".join(f"{msg}: {n}" for msg, n in r["errors"].items()) or "—"
+        print(
+            f"{r['profile']:<8} {r['reads_per_s']:>8} {r['read_p50_ms']:>7} {r['read_p99_ms']:>8} "
+            f"{r['writes_per_s']:>9} {r['write_p50_ms']:>7} {r['write_p99_ms']:>8}  {errors}"
+        )
+
+
+if __name__ == "__main__":
+    main()
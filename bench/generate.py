@@ -0,0 +1,224 @@
+"""bench/generate.py — синтетическая БД для бенчмарков
+
+Заполняет отдельный SQLite-файл правдоподобными объёмами: пользователи
+в нескольких часовых поясах, активность со «степенным» распределением
+(немного очень активных, много редких), граф друзей с хвостом из
+пользователей с сотнями друзей, история за DAYS дней до момента
+генерации. Генерация детерминирована (--seed).
+
+    python -m bench.generate --preset M
+    python -m bench.generate --users 5000 --meals 300000 --out /tmp/x.db
+
+Схема создаётся тем же кодом, что и у бота (models_and_db + migrations),
+DailyTotals пересобирается по сгенерированным данным.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent / "data"
+DAYS = 180
+
+# пресет → (пользователей, приёмов пищи)
+PRESETS = {
+    "S": (1_000, 100_000),
+    "M": (10_000, 1_000_000),
+    "L": (100_000, 10_000_000),
+}
+WORKOUTS_PER_MEAL = 0.3
+WEIGHTS_PER_MEAL = 0.2
+FRIENDS_ALPHA = 1.2      # Парето: средняя степень ≈ 6, хвост до сотен
+
+TZS = ["Europe/Moscow"] * 6 + ["Europe/Berlin", "Asia/Yekaterinburg", "Asia/Novosibirsk", "Asia/Tokyo"]
+FOODS = ["Овсянка 250 г", "Гречка с курицей", "Творог 200 г", "2 яйца и тост", "Борщ", "Салат", "Пицца 2 куска"]
+ACTIVITIES = [("бег", 10), ("силовая", 6), ("ходьба", 4), ("велосипед", 8), ("йога", 3), ("плавание", 8)]
+
+CHUNK = 50_000
+
+
+def db_path(preset: str) -> Path:
+    return DATA_DIR / f"bench_{preset}.db"
+
+
+def _ts(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%d %H:%M:%S.%f")     # формат DateTime SQLAlchemy для SQLite
+
+
+def _prepare_schema(path: Path) -> None:
+    """Создаёт схему кодом бота: DB_PATH подменяется до импорта config."""
+    os.environ["DB_PATH"] = str(path.resolve())
+    os.environ.setdefault("BOT_TOKEN", "0:bench")
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    import models_and_db  # noqa: F401  — init_db() при импорте
+
+    models_and_db.engine.dispose()
+    models_and_db.async_engine.sync_engine.dispose()
+
+
+def _activity(rng: random.Random, users: int, total: int) -> list[int]:
+    """Сколько записей у каждого пользователя: Парето-веса, сумма ≈ total."""
+    weights = [rng.paretovariate(1.3) for _ in range(users)]
+    scale = total / sum(weights)
+    return [int(w * scale) for w in weights]
+
+
+def _insert(conn: sqlite3.Connection, sql: str, rows) -> int:
+    batch, n = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= CHUNK:
+            conn.executemany(sql, batch)
+            n += len(batch)
+            batch.clear()
+    if batch:
+        conn.executemany(sql, batch)
+        n += len(batch)
+    return n
+
+
+def generate(path: Path, users: int, meals: int, seed: int = 42) -> dict:
+    started = time.perf_counter()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
+    _prepare_schema(path)
+
+    from migrations import rebuild_daily_totals
+    from models_and_db import engine
+    from utils.time import utc_minute_of_day
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    span = DAYS * 86400
+
+    def moment() -> str:
+        return _ts(now - timedelta(seconds=rng.random() * span))
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+
+    # ── пользователи
+    buckets: dict[tuple[str, int], int] = {}
+
+    def bucket(tz: str, minute: int) -> int:
+        if (tz, minute) not in buckets:
+            buckets[tz, minute] = utc_minute_of_day(tz, minute)
+        return buckets[tz, minute]
+
+    def user_rows():
+        for i in range(users):
+            tz = rng.choice(TZS)
+            morning = rng.choice([360, 390, 420, 450, 480])
+            evening = rng.choice([1290, 1320, 1350, 1380])
+            height = rng.randint(155, 195)
+            weight = round(rng.uniform(50, 110), 1)
+            yield (
+                10**9 + i, f"user{i}", rng.randint(18, 65), height, weight,
+                rng.choice(["Мужской", "Женский"]), round(weight / (height / 100) ** 2, 1),
+                rng.randint(1700, 3200), rng.random() < 0.03,
+                tz, morning, evening, bucket(tz, morning), bucket(tz, evening),
+            )
+
+    _insert(
+        conn,
+        'INSERT INTO "user" (chat_id, username, age, height_cm, weight_kg, gender, bmi, tdee, '
+        "is_blocked, tz, morning_min, evening_min, morning_utc_min, evening_utc_min) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        user_rows(),
+    )
+
+    per_user = _activity(rng, users, meals)
+
+    # ── еда, тренировки, вес, чекпоинты
+    def meal_rows():
+        for uid, n in enumerate(per_user, start=1):
+            for _ in range(n):
+                food = rng.choice(FOODS)
+                yield uid, moment(), food, food, rng.randint(80, 900)
+
+    def workout_rows():
+        for uid, n in enumerate(per_user, start=1):
+            for _ in range(int(n * WORKOUTS_PER_MEAL)):
+                kind, met = rng.choice(ACTIVITIES)
+                minutes = rng.choice([20, 30, 45, 60, 90])
+                yield uid, moment(), f"{kind} {minutes} мин", kind, minutes, -met * minutes, "local"
+
+    def weight_rows():
+        for uid, n in enumerate(per_user, start=1):
+            base = rng.uniform(50, 110)
+            for _ in range(int(n * WEIGHTS_PER_MEAL)):
+                yield uid, moment(), round(base + rng.uniform(-3, 3), 1), None
+
+    def checkpoint_rows():
+        for uid, n in enumerate(per_user, start=1):
+            for _ in range(min(n // 20, 500)):
+                yield uid, moment()
+
+    counts = {"users": users}
+    counts["meals"] = _insert(
+        conn,
+        "INSERT INTO meal (user_id, created_at, raw_text, description, calories) VALUES (?, ?, ?, ?, ?)",
+        meal_rows(),
+    )
+    counts["workouts"] = _insert(
+        conn,
+        "INSERT INTO workout (user_id, created_at, raw_text, type, duration_min, calories, method) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        workout_rows(),
+    )
+    counts["weights"] = _insert(
+        conn, "INSERT INTO weight (user_id, created_at, weight_kg, bmi) VALUES (?, ?, ?, ?)", weight_rows()
+    )
+    counts["checkpoints"] = _insert(
+        conn, "INSERT INTO checkpoint (user_id, created_at) VALUES (?, ?)", checkpoint_rows()
+    )
+
+    # ── граф друзей: степень по Парето, рёбра симметричны
+    pairs: set[tuple[int, int]] = set()
+    for uid in range(1, users + 1):
+        degree = min(int(rng.paretovariate(FRIENDS_ALPHA)), 500, users - 1)
+        for _ in range(degree):
+            other = rng.randint(1, users)
+            if other != uid:
+                pairs.add((uid, other))
+                pairs.add((other, uid))
+    counts["friends"] = _insert(
+        conn, "INSERT INTO friend (user_id, friend_id) VALUES (?, ?)", sorted(pairs)
+    )
+    conn.commit()
+    conn.close()
+
+    with engine.begin() as sa_conn:
+        rebuild_daily_totals(sa_conn)
+        sa_conn.exec_driver_sql("ANALYZE")
+    engine.dispose()
+
+    counts["seconds"] = round(time.perf_counter() - started, 1)
+    return counts
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--preset", choices=PRESETS, default="S")
+    ap.add_argument("--users", type=int)
+    ap.add_argument("--meals", type=int)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", type=Path)
+    args = ap.parse_args()
+
+    users, meals = PRESETS[args.preset]
+    path = args.out or db_path(args.preset)
+    counts = generate(path, args.users or users, args.meals or meals, args.seed)
+    print(path, counts)
+
+
+if __name__ == "__main__":
+    main()
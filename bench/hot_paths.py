@@ -0,0 +1,282 @@
+"""bench/hot_paths.py — латентность и число SQL-запросов горячих путей БД
+
+Для каждой синтетической БД (bench/generate.py) замеряются функции,
+которые дергают хендлеры на каждое нажатие: calc_stats за 1/7/90 дней,
+страницы чекпоинтов и друзей (первая и «глубокая»), рейтинг друзей,
+страница истории еды и выборка chat_id для минутной рассылки. Кэши
+статистики и рейтинга перед каждым вызовом сбрасываются — меряется БД.
+
+Результат — JSON (версия формата, окружение, размеры данных, по каждому
+случаю p50/p90/p99/max/mean в мс и запросов на вызов), который можно
+сравнить с прошлым прогоном:
+
+    python -m bench.hot_paths --preset S M
+    python -m bench.hot_paths --preset S --compare bench/results/base.json
+
+Каждая БД меряется в отдельном процессе: models_and_db привязывается к
+DB_PATH при импорте.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from bench.generate import PRESETS, db_path, generate
+
+FORMAT_VERSION = 1
+RESULTS_DIR = Path(__file__).parent / "results"
+SAMPLE_USERS = 50
+
+
+# ─────────────────────── замер в дочернем процессе ───────────────────────
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _measure(path: Path, iters: int, seed: int) -> list[dict]:
+    from sqlalchemy import event, func
+    from sqlmodel import select
+
+    from handlers.analytics import checkpoint_page_kb
+    from handlers.friends import friends_page_kb
+    from models_and_db import (
+        SYNC_ENGINES,
+        async_engine,
+        get_async_session,
+        read_engine,
+        Checkpoint,
+        Friend,
+        Meal,
+        User,
+    )
+    from services import leaderboard as lb
+    from services import stats
+    from services.broadcast import iter_chat_ids
+    from services.paging import seek_page
+
+    queries = 0
+
+    def count(*_):
+        nonlocal queries
+        queries += 1
+
+    for engine in SYNC_ENGINES:
+        event.listen(engine, "before_cursor_execute", count)
+
+    rng = random.Random(seed)
+    async with get_async_session() as s:
+        # активные пользователи: у кого есть еда (распределение тяжёлое — берём разных)
+        ids = (await s.exec(select(Meal.user_id).distinct())).all()
+        users = [await s.get(User, uid) for uid in rng.sample(ids, min(SAMPLE_USERS, len(ids)))]
+        anchor = (await s.exec(select(func.max(Meal.created_at)))).one()
+        minute = (
+            await s.exec(
+                select(User.morning_utc_min)
+                .group_by(User.morning_utc_min)
+                .order_by(func.count().desc())
+                .limit(1)
+            )
+        ).one()
+        # «глубокие» курсоры: второй с конца чекпоинт / друг
+        cp_cursor, fr_cursor = {}, {}
+        for u in users:
+            cp = (
+                await s.exec(
+                    select(Checkpoint.created_at, Checkpoint.id)
+                    .where(Checkpoint.user_id == u.id)
+                    .order_by(Checkpoint.created_at, Checkpoint.id)
+                    .offset(1)
+                    .limit(1)
+                )
+            ).first()
+            cp_cursor[u.id] = tuple(cp) if cp else None
+            fr = (
+                await s.exec(
+                    select(Friend.friend_id)
+                    .where(Friend.user_id == u.id)
+                    .order_by(Friend.friend_id.desc())
+                    .offset(1)
+                    .limit(1)
+                )
+            ).first()
+            fr_cursor[u.id] = fr
+
+    async def stats_for(days: int):
+        async def run(u):
+            stats.invalidate_stats(u.id)
+            await stats.calc_stats(u, anchor - timedelta(days=days), anchor)
+        return run
+
+    async def leaderboard(u):
+        lb._cache.pop(u.id)
+        await lb.leaderboard(u.id)
+
+    async def meal_page(u):
+        async with get_async_session() as s:
+            await seek_page(
+                s,
+                stats.meal_rows_stmt(u.id, anchor - timedelta(days=90), anchor),
+                [Meal.created_at, Meal.id],
+                size=15,
+            )
+
+    async def reminder_ids(_):
+        async for _chat_id in iter_chat_ids(User.morning_utc_min == minute):
+            pass
+
+    cases = {
+        "calc_stats_1d": await stats_for(1),
+        "calc_stats_7d": await stats_for(7),
+        "calc_stats_90d": await stats_for(90),
+        "checkpoint_page_first": lambda u: checkpoint_page_kb(u),
+        "checkpoint_page_deep": lambda u: checkpoint_page_kb(u, cp_cursor[u.id], backward=True),
+        "friends_page_first": lambda u: friends_page_kb(u.id),
+        "friends_page_deep": lambda u: friends_page_kb(u.id, fr_cursor[u.id], backward=True),
+        "leaderboard": leaderboard,
+        "meal_page_90d": meal_page,
+        "reminder_chat_ids": reminder_ids,
+    }
+
+    results = []
+    for name, fn in cases.items():
+        await fn(users[0])                     # прогрев соединений и кэша страниц
+        timings, before = [], queries
+        for i in range(iters):
+            t0 = time.perf_counter()
+            await fn(users[i % len(users)])
+            timings.append((time.perf_counter() - t0) * 1000)
+        results.append(
+            {
+                "case": name,
+                "n": iters,
+                "p50_ms": round(_percentile(timings, 0.50), 3),
+                "p90_ms": round(_percentile(timings, 0.90), 3),
+                "p99_ms": round(_percentile(timings, 0.99), 3),
+                "max_ms": round(max(timings), 3),
+                "mean_ms": round(statistics.fmean(timings), 3),
+                "queries_per_call": round((queries - before) / iters, 2),
+            }
+        )
+    await async_engine.dispose()
+    await read_engine.dispose()
+    return results
+
+
+def _child(path: Path, iters: int, seed: int) -> None:
+    os.environ["DB_PATH"] = str(path.resolve())
+    os.environ.setdefault("BOT_TOKEN", "0:bench")
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    print(json.dumps(asyncio.run(_measure(path, iters, seed))))
+
+
+# ─────────────────────── оркестрация ───────────────────────
+def _dataset_info(path: Path) -> dict:
+    conn = sqlite3.connect(path)
+    info = {
+        table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        for table in ("user", "meal", "workout", "weight", "checkpoint", "friend")
+    }
+    conn.close()
+    info["path"] = str(path)
+    info["size_mb"] = round(path.stat().st_size / 2**20, 1)
+    return info
+
+
+def _environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "git": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(current: dict, baseline: dict) -> None:
+    """Печатает изменение p50/p99 относительно прошлого прогона."""
+    base = {(r["dataset"], r["case"]): r for r in baseline["results"]}
+    print(f"\n{'dataset':<8} {'case':<24} {'p50':>16} {'p99':>16}")
+    for r in current["results"]:
+        old = base.get((r["dataset"], r["case"]))
+        if not old:
+            continue
+        cells = [
+            f"{old[k]:.2f}→{r[k]:.2f} ({r[k] / old[k] - 1:+.0%})" if old[k] else f"→{r[k]:.2f}"
+            for k in ("p50_ms", "p99_ms")
+        ]
+        print(f"{r['dataset']:<8} {r['case']:<24} {cells[0]:>16} {cells[1]:>16}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--preset", nargs="+", choices=PRESETS, default=["S"])
+    ap.add_argument("--iters", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", type=Path)
+    ap.add_argument("--compare", type=Path, help="JSON прошлого прогона")
+    ap.add_argument("--child", type=Path, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        _child(args.child, args.iters, args.seed)
+        return
+
+    report = {
+        "version": FORMAT_VERSION,
+        "created": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "env": _environment(),
+        "datasets": {},
+        "results": [],
+    }
+    for preset in args.preset:
+        path = db_path(preset)
+        if not path.exists():
+            print(f"generating {path}…", file=sys.stderr)
+            generate(path, *PRESETS[preset], seed=args.seed)
+        report["datasets"][preset] = _dataset_info(path)
+
+        out = subprocess.run(
+            [sys.executable, "-m", "bench.hot_paths", "--child", str(path),
+             "--iters", str(args.iters), "--seed", str(args.seed)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        for row in json.loads(out.strip().splitlines()[-1]):
+            report["results"].append({"dataset": preset, **row})
+
+    print(f"{'dataset':<8} {'case':<24} {'p50':>8} {'p90':>8} {'p99':>8} {'q/call':>7}")
+    for r in report["results"]:
+        print(
+            f"{r['dataset']:<8} {r['case']:<24} {r['p50_ms']:>8.2f} "
+            f"{r['p90_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['queries_per_call']:>7}"
+        )
+
+    out_path = args.out or RESULTS_DIR / f"hot_paths_{datetime.utcnow():%Y%m%d_%H%M%S}.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"\nsaved {out_path}")
+
+    if args.compare:
+        compare(report, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
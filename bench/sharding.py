@@ -0,0 +1,128 @@
+"""bench/sharding.py — пропускная способность супервизора при 1…N воркерах
+
+Апдейты /menu от разных чатов раскладываются по shard_of в процессы-воркеры
+(supervisor.run_worker) — с разбором в модели aiogram, UserMiddleware,
+роутингом и сборкой ответа. Сеть заменена NullSession: запрос к Bot API
+только сериализуется, ответ — готовый Message.
+
+    python -m bench.sharding --workers 1 2 4 --updates 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import multiprocessing as mp
+import time
+from datetime import datetime
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMessage
+from aiogram.types import Chat, Message
+
+from supervisor import run_worker, shard_of
+
+
+class NullSession(BaseSession):
+    """Сессия без сети: считает отправленные сообщения в общем счётчике."""
+
+    def __init__(self, sent):
+        super().__init__()
+        self.sent = sent
+
+    async def make_request(self, bot, method, timeout=None):
+        json.dumps(self.prepare_value(method.model_dump(warnings=False), bot=bot, files={}))
+        if isinstance(method, SendMessage):
+            with self.sent.get_lock():
+                self.sent.value += 1
+            return Message(
+                message_id=1,
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"),
+                text=method.text,
+            )
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def bench_bot(sent) -> Bot:
+    return Bot("123456:bench", session=NullSession(sent))
+
+
+def menu_update(update_id: int, chat_id: int) -> dict:
+    user = {"id": chat_id, "is_bot": False, "first_name": "bench"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": user,
+            "text": "/menu",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 5}],
+        },
+    }
+
+
+def wait_for(sent, target: int, timeout: float = 300) -> None:
+    deadline = time.monotonic() + timeout
+    while sent.value < target:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"обработано {sent.value} из {target}")
+        time.sleep(0.01)
+
+
+def run(workers: int, updates: int, chats: int) -> float:
+    ctx = mp.get_context("spawn")
+    sent = ctx.Value("i", 0)
+    inboxes = [ctx.Queue(1000) for _ in range(workers)]
+    procs = [
+        ctx.Process(target=run_worker, args=(i, inbox, functools.partial(bench_bot, sent)))
+        for i, inbox in enumerate(inboxes)
+    ]
+    for proc in procs:
+        proc.start()
+
+    # прогрев: по апдейту в каждый воркер (импорты, старт диспетчера)
+    for i in range(workers):
+        inboxes[i].put(menu_update(i, i))
+    wait_for(sent, workers)
+
+    t0 = time.perf_counter()
+    for n in range(updates):
+        update = menu_update(workers + n, 1000 + n % chats)
+        inboxes[shard_of(update, workers)].put(update)
+    wait_for(sent, workers + updates)
+    elapsed = time.perf_counter() - t0
+
+    for inbox in inboxes:
+        inbox.put(None)
+    for proc in procs:
+        proc.join(60)
+    return updates / elapsed
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--updates", type=int, default=10_000)
+    ap.add_argument("--chats", type=int, default=500)
+    args = ap.parse_args()
+
+    base = None
+    print(f"{'workers':>7} {'upd/s':>9} {'speedup':>8}")
+    for workers in args.workers:
+        rate = run(workers, args.updates, args.chats)
+        base = base or rate
+        print(f"{workers:>7} {rate:>9.0f} {rate / base:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,16 @@ class Settings:
     # модель и параметры GPT
     GPT_MODEL: str = "gpt-4o-mini"   # можно заменить на gpt-4o при необходимости
     GPT_TIMEOUT: int = 30            # секунд ожидания ответа
+    GPT_MAX_CONCURRENCY: int = int(os.getenv("GPT_MAX_CONCURRENCY", "8"))  # запросов одновременно
+    GPT_MAX_CONNECTIONS: int = 16    # HTTP-соединений в пуле клиента
+    GPT_BATCH_WINDOW_MS: int = 100   # окно сбора оценок в один запрос
+    GPT_BATCH_MAX: int = 10          # максимум оценок в одном запросе
+    STREAM_EDIT_INTERVAL: float = 1.5  # секунд между правками потокового ответа
+
+    # кэш оценок еды/тренировок
+    GPT_CACHE_LRU_SIZE: int = 5000   # записей в памяти процесса
+    GPT_CACHE_MAX_ROWS: int = int(os.getenv("GPT_CACHE_MAX_ROWS", "200000"))
+    GPT_CACHE_TTL_DAYS: int = 30
 
     # коэффициент активности для TDEE
     ACTIVITY_COEF: float = 1.25
@@ -29,6 +39,81 @@ class Settings:
     # База данных
     DB_PATH: str = os.getenv("DB_PATH", "fitness.db")
     DB_ECHO: bool = bool(int(os.getenv("DB_ECHO", "0")))  # логировать SQL
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))        # соединений aiosqlite
+    DB_POOL_OVERFLOW: int = int(os.getenv("DB_POOL_OVERFLOW", "5"))  # сверх пула при пиках
+    DB_POOL_TIMEOUT: int = 10        # секунд ожидания свободного соединения
+    # wal — WAL, один пишущий + пул читающих соединений; legacy — rollback-журнал, общий пул
+    DB_PROFILE: str = os.getenv("DB_PROFILE", "wal")
+    DB_READ_POOL_SIZE: int = int(os.getenv("DB_READ_POOL_SIZE", "4"))  # читающих соединений (wal)
+    DB_BUSY_TIMEOUT_MS: int = 5000   # ждать блокировку другого процесса
+    DB_CACHE_MB: int = 32            # кэш страниц на соединение (wal)
+    DB_MMAP_MB: int = 256            # чтение через mmap (wal)
+
+    # журнал медленных запросов (services/slow_queries.py)
+    SLOW_QUERY_MS: int = int(os.getenv("SLOW_QUERY_MS", "200"))  # 0 — не логировать
+    SLOW_QUERY_LOG_INTERVAL: int = 60  # секунд: одна форма запроса — не чаще
+    SLOW_QUERY_LOG_MAX: int = 20     # записей в минуту на процесс
+    SLOW_QUERY_REPORT_INTERVAL: int = int(os.getenv("SLOW_QUERY_REPORT_INTERVAL", "3600"))  # 0 — без топа
+    SLOW_QUERY_TOP: int = 10         # форм запросов в отчёте
+
+    # Режим запуска: long-polling или webhook (webhook.py)
+    RUN_MODE: str = os.getenv("RUN_MODE", "polling")        # polling | webhook
+    WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "")          # https://bot.example.com
+    WEBHOOK_PATH: str = "/telegram/webhook"
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")    # пусто — производный от токена
+    WEBHOOK_HOST: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8080"))
+    WEBHOOK_MAX_CONNECTIONS: int = 40  # параллельных доставок со стороны Telegram
+    WEBHOOK_WORKERS: int = 32        # задач, разбирающих апдейты
+    WEBHOOK_QUEUE: int = 1000        # апдейтов в очереди; сверх — 503
+    WEBHOOK_DRAIN_TIMEOUT: float = 25.0  # секунд на дообработку при остановке
+    WORKERS: int = int(os.getenv("WORKERS", "1"))  # >1 — процессы-воркеры (supervisor.py)
+
+    # Рассылки планировщика
+    BROADCAST_RATE: float = 25.0     # сообщений/сек (лимит Telegram ≈ 30)
+    BROADCAST_CONCURRENCY: int = 20  # одновременных send_message
+    BROADCAST_CHUNK: int = 1000      # chat_id за один запрос к БД
+
+    # кэш пользователей (middlewares/user.py)
+    USER_CACHE_SIZE: int = 10_000
+    USER_CACHE_TTL: int = 300        # секунд
+    USER_MISSING_TTL: int = 30       # секунд помнить, что chat_id не зарегистрирован
+
+    # FSM-хранилище (services/fsm_storage.py)
+    FSM_STORAGE: str = os.getenv("FSM_STORAGE", "sqlite")   # sqlite | redis | memory
+    FSM_DB_PATH: str = os.getenv("FSM_DB_PATH", "fsm.db")
+    FSM_REDIS_URL: str = os.getenv("FSM_REDIS_URL", "redis://localhost:6379/1")
+    FSM_TTL: int = 2 * 24 * 3600     # секунд: старше — брошенное состояние
+    FSM_FLUSH_INTERVAL: float = 0.5  # секунд между сбросами правок в БД
+    FSM_CACHE_SIZE: int = 10_000     # ключей в памяти процесса
+
+    # кэш статистики (services/stats.py)
+    STATS_CACHE_USERS: int = 5000    # пользователей в кэше
+    STATS_CACHE_PER_USER: int = 8    # интервалов на пользователя
+    STATS_CACHE_TTL: int = 120       # секунд
+
+    # рейтинг друзей (services/leaderboard.py)
+    LEADERBOARD_TTL: int = 60        # секунд
+    LEADERBOARD_CACHE_SIZE: int = 2000
+
+    # обслуживание БД (services/maintenance.py), ночью по МСК
+    MAINT_HOUR: int = int(os.getenv("MAINT_HOUR", "4"))
+    MAINT_MINUTE: int = 15
+    RAW_TEXT_KEEP_DAYS: int = int(os.getenv("RAW_TEXT_KEEP_DAYS", "90"))  # старше — в архив
+    FRIEND_REQUEST_KEEP_DAYS: int = 30  # закрытые (и зависшие pending) запросы дружбы
+    MAINT_BATCH: int = 1000          # строк за одну транзакцию
+    MAINT_PAUSE: float = 0.2         # секунд между шагами — бот успевает писать
+    MAINT_BUDGET: int = 15 * 60      # секунд на весь прогон
+    MAINT_VACUUM_PAGES: int = 1000   # страниц за шаг incremental_vacuum
+
+    # выгрузка истории /export (services/export.py)
+    EXPORT_FETCH: int = 1000         # строк за одну выборку курсора
+    EXPORT_CONCURRENCY: int = 2      # одновременных выгрузок на процесс
+    EXPORT_MAX_MB: int = 49          # лимит Bot API на документ — 50 МБ
+
+    # метрики Prometheus (services/metrics.py)
+    METRICS_HOST: str = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "9321"))  # 0 — не поднимать /metrics
 
     # Прочее
     TZ_OFFSET_HOURS: int = 3         # Москва (UTC+3)
@@ -1,20 +1,15 @@
-"""handlers/ai_help.py — ИИ-консультант, работает с openai-python ≥1.0 без AsyncOpenAI"""
+"""handlers/ai_help.py — ИИ-консультант: потоковый ответ через services.gpt_client"""
 
-import asyncio
 from aiogram import Router, F, types
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 
-from sqlmodel import select
-from openai import OpenAI, OpenAIError
-
-from config import settings
-from models_and_db import get_session, User
+from models_and_db import User
 from handlers.menu import menu_button
+from services import streaming
+from services.gpt_client import GPTError, chat_stream
 
 router = Router()
-# обычный (синхронный) клиент: не трогает httpx proxies → избегаем ошибки
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
 
 # ────────────── FSM ──────────────
@@ -35,14 +30,12 @@ async def ask_question(call: types.CallbackQuery, state: FSMContext):
 
 
 @router.message(AskState.question)
-async def answer_question(msg: types.Message, state: FSMContext):
+async def answer_question(msg: types.Message, state: FSMContext, user: User | None):
     question = msg.text or ""
 
-    with get_session() as s:
-        user = s.exec(select(User).where(User.chat_id == msg.from_user.id)).first()
-        if not user:
-            await msg.answer("Сначала пройди регистрацию /start")
-            return
+    if not user:
+        await msg.answer("Сначала пройди регистрацию /start")
+        return
 
     system_prompt = (
         "Ты опытный фитнес-тренер и нутрициолог. Отвечай кратко и по делу.\n"
@@ -51,27 +44,24 @@ async def answer_question(msg: types.Message, state: FSMContext):
         f"Его TDEE ≈ {user.tdee} ккал."
     )
 
-    # вызов синхронного клиента в отдельном потоке, чтобы не блокировать event-loop
-    loop = asyncio.get_running_loop()
+    # FSM — до потока: хендлер не ждёт ответа, и lock чата (webhook.UpdatePool)
+    # свободен — «🏠 Меню» может отменить поток через streaming.cancel()
+    await state.clear()
+    placeholder = await msg.answer("🤖 Думаю…", reply_markup=menu_button())
+    streaming.start(msg.chat.id, _stream_answer(placeholder, question, system_prompt))
 
-    def _ask():
-        return client.chat.completions.create(
-            model=settings.GPT_MODEL,
-            temperature=0.7,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": question},
-            ],
-        )
 
+async def _stream_answer(placeholder: types.Message, question: str, system_prompt: str) -> None:
+    """Правит placeholder по мере генерации; ошибка GPT — вместо ответа."""
     try:
-        resp = await loop.run_in_executor(None, _ask)
-        answer = resp.choices[0].message.content.strip()
-    except OpenAIError as e:
-        answer = (
+        await streaming.stream_to_message(
+            placeholder,
+            chat_stream(question, system=system_prompt, temperature=0.7, op="ai_help"),
+            reply_markup=menu_button(),
+        )
+    except GPTError as e:
+        await placeholder.edit_text(
             "⚠️ Не удалось получить ответ от ИИ. Попробуй позже.\n\n"
-            f"Техническая ошибка: {e}"
+            f"Техническая ошибка: {e}",
+            reply_markup=menu_button(),
         )
-
-    await msg.answer(answer, reply_markup=menu_button())
-    await state.clear()
@@ -1,42 +1,30 @@
 """handlers/analytics.py — интервал, чекпоинты, краткая и детальная статистика
-    + список приёмов пищи (Дата-время — еда, ккал) в развёрнутой статистике
+    + постраничный список приёмов пищи (Дата-время — еда, ккал) интервала
 """
 
 from datetime import datetime, timedelta, timezone
-from typing import Any
 from zoneinfo import ZoneInfo
 
 from aiogram import Router, F, types
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from sqlalchemy import func
 from sqlmodel import select
 
 from models_and_db import (
-    get_session,
+    get_read_session,
     User,
-    Workout,
-    Meal,
-    Weight,
     Checkpoint,
+    Meal,
 )
-from handlers.menu import menu_button
+from services.paging import parse_ts_cursor, seek_page, ts_cursor
+from services.stats import calc_stats, meal_rows_stmt
 
 router = Router()
 ITEMS_PER_PAGE = 5
 MSK = ZoneInfo("Europe/Moscow")
+MEALS_PER_PAGE = 15
 
 
 # ────────────────────────── утилиты ──────────────────────────
-def _scalar(raw: Any) -> int:
-    if raw is None:
-        return 0
-    if isinstance(raw, tuple):
-        return raw[0]
-    if hasattr(raw, "_mapping"):
-        return list(raw._mapping.values())[0]
-    return int(raw)
-
-
 def moscow_now() -> datetime:
     return datetime.utcnow().replace(tzinfo=timezone.utc).astimezone(MSK)
 
@@ -45,7 +33,7 @@ def fmt(n: int | float) -> str:
     return f"{int(n):,}".replace(",", " ")
 
 
-def interval_from_choice(user_id: int, choice: str) -> tuple[datetime, datetime]:
+async def interval_from_choice(user_id: int, choice: str) -> tuple[datetime, datetime]:
     now_utc = datetime.utcnow()
     if choice == "1d":
         start = now_utc.replace(hour=0, minute=1, second=0, microsecond=0)
@@ -55,8 +43,8 @@ def interval_from_choice(user_id: int, choice: str) -> tuple[datetime, datetime]
         )
     else:
         cp_id = int(choice.split("_")[1])
-        with get_session() as s:
-            cp = s.get(Checkpoint, cp_id)
+        async with get_read_session() as s:
+            cp = await s.get(Checkpoint, cp_id)
         start = cp.created_at.astimezone(timezone.utc).replace(tzinfo=None)
     return start, now_utc
 
@@ -66,34 +54,29 @@ def analytics_main_kb() -> types.InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
     kb.button(text="За 1 день", callback_data="an_1d")
     kb.button(text="За 7 дней", callback_data="an_7d")
-    kb.button(text="Выбрать чекпоинт", callback_data="an_cp_page_0")
+    kb.button(text="Выбрать чекпоинт", callback_data="an_cp_page")
     kb.button(text="Меню", callback_data="menu")
     kb.adjust(1)
     return kb.as_markup()
 
 
-def checkpoint_page_kb(chat_id: int, page: int = 0) -> types.InlineKeyboardMarkup:
-    with get_session() as s:
-        user = s.exec(select(User).where(User.chat_id == chat_id)).first()
-        if not user:
-            cps, total = [], 0
-        else:
-            total = _scalar(
-                s.exec(
-                    select(func.count())
-                    .select_from(Checkpoint)
-                    .where(Checkpoint.user_id == user.id)
-                ).first()
-            )
-            cps = (
-                s.exec(
-                    select(Checkpoint)
-                    .where(Checkpoint.user_id == user.id)
-                    .order_by(Checkpoint.created_at.desc())
-                    .offset(page * ITEMS_PER_PAGE)
-                    .limit(ITEMS_PER_PAGE)
-                ).all()
+async def checkpoint_page_kb(
+    user: User | None, cursor: tuple[datetime, int] | None = None, backward: bool = False
+) -> types.InlineKeyboardMarkup:
+    """Чекпоинты от новых к старым; keyset по индексу (user_id, created_at)."""
+    cps, has_prev, has_next = [], False, False
+    if user:
+        async with get_read_session() as s:
+            page = await seek_page(
+                s,
+                select(Checkpoint).where(Checkpoint.user_id == user.id),
+                [Checkpoint.created_at, Checkpoint.id],
+                cursor,
+                backward=backward,
+                size=ITEMS_PER_PAGE,
+                descending=True,
             )
+        cps, has_prev, has_next = page.rows, page.has_prev, page.has_next
 
     kb = InlineKeyboardBuilder()
     for cp in cps:
@@ -105,96 +88,16 @@ def checkpoint_page_kb(chat_id: int, page: int = 0) -> types.InlineKeyboardMarku
     if not cps:
         kb.button(text="— чекпоинтов нет —", callback_data="ignore")
 
-    if page > 0:
-        kb.button(text="◀️ Назад", callback_data=f"an_cp_page_{page-1}")
-    if (page + 1) * ITEMS_PER_PAGE < total:
-        kb.button(text="Вперёд ▶️", callback_data=f"an_cp_page_{page+1}")
+    if has_prev:
+        kb.button(text="◀️ Назад", callback_data=f"an_cp_page_b_{ts_cursor(cps[0].created_at, cps[0].id)}")
+    if has_next:
+        kb.button(text="Вперёд ▶️", callback_data=f"an_cp_page_a_{ts_cursor(cps[-1].created_at, cps[-1].id)}")
 
     kb.button(text="Меню", callback_data="menu")
     kb.adjust(1)
     return kb.as_markup()
 
 
-# ───────────────────── подсчёт статистики ─────────────────────
-def calc_stats(user: User, start: datetime, end: datetime) -> dict:
-    delta_days = (end - start).total_seconds() / 86400
-
-    with get_session() as s:
-        meals_sum = _scalar(
-            s.exec(
-                select(func.sum(Meal.calories)).where(
-                    (Meal.user_id == user.id) & (Meal.created_at.between(start, end))
-                )
-            ).first()
-        )
-        workouts_sum = _scalar(
-            s.exec(
-                select(func.sum(Workout.calories)).where(
-                    (Workout.user_id == user.id)
-                    & (Workout.created_at.between(start, end))
-                )
-            ).first()
-        )
-        workouts_cnt = _scalar(
-            s.exec(
-                select(func.count())
-                .select_from(Workout)
-                .where(
-                    (Workout.user_id == user.id)
-                    & (Workout.created_at.between(start, end))
-                )
-            ).first()
-        )
-        rows = s.exec(
-            select(Workout.type, func.count())
-            .where(
-                (Workout.user_id == user.id)
-                & (Workout.created_at.between(start, end))
-            )
-            .group_by(Workout.type)
-            .order_by(func.count().desc())
-        ).all()
-        popular = [f"{r[0]} ({r[1]})" for r in rows]
-
-        meal_rows = s.exec(
-            select(Meal)
-            .where((Meal.user_id == user.id) & (Meal.created_at.between(start, end)))
-            .order_by(Meal.created_at)
-        ).all()
-
-        start_w = s.exec(
-            select(Weight)
-            .where((Weight.user_id == user.id) & (Weight.created_at <= start))
-            .order_by(Weight.created_at.desc())
-        ).first()
-        end_w = s.exec(
-            select(Weight)
-            .where((Weight.user_id == user.id) & (Weight.created_at <= end))
-            .order_by(Weight.created_at.desc())
-        ).first()
-
-    delta_w = (
-        round(end_w.weight_kg - start_w.weight_kg, 1)
-        if (start_w and end_w)
-        else 0.0
-    )
-    metab = int(user.tdee * delta_days)
-    balance = meals_sum + workouts_sum - metab
-
-    return {
-        "delta_w": delta_w,
-        "start_w": start_w.weight_kg if start_w else "—",
-        "end_w": end_w.weight_kg if end_w else "—",
-        "meals": meals_sum,
-        "workouts": workouts_sum,
-        "metab": -metab,
-        "balance": balance,
-        "workouts_cnt": workouts_cnt,
-        "popular": popular,
-        "meal_rows": meal_rows,  # список объектов Meal
-    }
-
-
 # ───────────────────────── handlers ─────────────────────────
 @router.callback_query(F.data == "analytics")
 async def open_analytics(call: types.CallbackQuery):
@@ -202,29 +105,32 @@ async def open_analytics(call: types.CallbackQuery):
 
 
 @router.callback_query(F.data.in_(["an_1d", "an_7d"]))
-async def analytics_interval(call: types.CallbackQuery):
-    await show_stats(call, call.data.split("_")[1])
+async def analytics_interval(call: types.CallbackQuery, user: User | None):
+    await show_stats(call, user, call.data.split("_")[1])
 
 
-@router.callback_query(F.data.startswith("an_cp_page_"))
-async def cp_page(call: types.CallbackQuery):
-    page = int(call.data.split("_")[3])
+@router.callback_query(F.data.startswith("an_cp_page"))
+async def cp_page(call: types.CallbackQuery, user: User | None):
+    # an_cp_page — первая страница, an_cp_page_{a|b}_{мкс}_{id} — после/до курсора
+    parts = call.data.split("_", 4)
+    cursor = parse_ts_cursor(parts[4]) if len(parts) == 5 else None
     await call.message.edit_reply_markup(
-        reply_markup=checkpoint_page_kb(call.from_user.id, page)
+        reply_markup=await checkpoint_page_kb(user, cursor, backward=parts[3:4] == ["b"])
     )
 
 
 @router.callback_query(F.data.startswith("an_cp_"))
-async def cp_chosen(call: types.CallbackQuery):
-    await show_stats(call, f"cp_{call.data.split('_')[2]}")
+async def cp_chosen(call: types.CallbackQuery, user: User | None):
+    await show_stats(call, user, f"cp_{call.data.split('_')[2]}")
 
 
-async def show_stats(call: types.CallbackQuery, choice: str):
-    with get_session() as s:
-        user = s.exec(select(User).where(User.chat_id == call.from_user.id)).first()
+async def show_stats(call: types.CallbackQuery, user: User | None, choice: str):
+    if not user:
+        await call.answer("Сначала пройди регистрацию /start", show_alert=True)
+        return
 
-    start, end = interval_from_choice(call.from_user.id, choice)
-    st = calc_stats(user, start, end)
+    start, end = await interval_from_choice(call.from_user.id, choice)
+    st = await calc_stats(user, start, end)
 
     interval_str = (
         f"{start.astimezone(MSK):%d.%m.%Y %H:%M}"
@@ -248,31 +154,20 @@ async def show_stats(call: types.CallbackQuery, choice: str):
 
 
 @router.callback_query(F.data.startswith("an_more_"))
-async def details(call: types.CallbackQuery):
-    choice = call.data[len("an_more_") :]
-    with get_session() as s:
-        user = s.exec(select(User).where(User.chat_id == call.from_user.id)).first()
+async def details(call: types.CallbackQuery, user: User | None):
+    if not user:
+        await call.answer("Сначала пройди регистрацию /start", show_alert=True)
+        return
 
-    start, end = interval_from_choice(call.from_user.id, choice)
-    st = calc_stats(user, start, end)
+    choice = call.data[len("an_more_") :]
+    start, end = await interval_from_choice(call.from_user.id, choice)
+    st = await calc_stats(user, start, end)
 
     interval_str = (
         f"{start.astimezone(MSK):%d.%m.%Y %H:%M}"
         f"  —  {moscow_now():%d.%m.%Y %H:%M}"
     )
 
-    # формируем список приёмов пищи
-    meal_lines = [
-        f"{m.created_at.astimezone(MSK):%d.%m %H:%M} — {m.description} "
-        f"({m.calories} ккал)"
-        for m in st["meal_rows"]
-    ]
-    # чтобы не превысить лимит 4096 символов, ограничим вывод
-    joined_meals = "\n".join(meal_lines)
-    max_len = 3000  # оставим запас под остальной текст
-    if len(joined_meals) > max_len:
-        joined_meals = joined_meals[:max_len] + "\n…"
-
     text = (
         f"<b>Ваша статистика за интервал:</b>\n{interval_str}\n\n"
         f"<b>I. Вес</b>\n"
@@ -285,8 +180,59 @@ async def details(call: types.CallbackQuery):
         f"Баланс: <b>{fmt(st['balance'])} ккал</b>\n\n"
         f"<b>III. Тренировки</b>\n"
         f"Всего: {st['workouts_cnt']}\n"
-        f"Популярные: {', '.join(st['popular']) or 'нет'}\n\n"
-        f"<b>IV. Приёмы пищи</b>\n{joined_meals}"
+        f"Популярные: {', '.join(st['popular']) or 'нет'}"
         "\n\n\n <b>ИИ-ассистент для спорта и питания: @AI_sportик_bot</b>\n"
     )
-    await call.message.edit_text(text, reply_markup=menu_button())
+
+    kb = InlineKeyboardBuilder()
+    kb.button(text="🍽️ Приёмы пищи", callback_data=f"an_ml:{choice}")
+    kb.button(text="Меню", callback_data="menu")
+    kb.adjust(1)
+    await call.message.edit_text(text, reply_markup=kb.as_markup())
+
+
+@router.callback_query(F.data.startswith("an_ml:"))
+async def meals_page(call: types.CallbackQuery, user: User | None):
+    """Приёмы пищи интервала страницами: keyset по (created_at, id), только нужные колонки."""
+    if not user:
+        await call.answer("Сначала пройди регистрацию /start", show_alert=True)
+        return
+
+    # an_ml:{choice} — первая страница, an_ml:{choice}:{a|b}:{курсор} — после/до курсора
+    _, choice, *nav = call.data.split(":")
+    cursor = parse_ts_cursor(nav[1]) if nav else None
+    start, end = await interval_from_choice(call.from_user.id, choice)
+    async with get_read_session() as s:
+        page = await seek_page(
+            s,
+            meal_rows_stmt(user.id, start, end),
+            [Meal.created_at, Meal.id],
+            cursor,
+            backward=nav[:1] == ["b"],
+            size=MEALS_PER_PAGE,
+        )
+
+    lines = [
+        f"{created_at.astimezone(MSK):%d.%m %H:%M} — {description} ({calories} ккал)"
+        for _, created_at, description, calories in page.rows
+    ]
+    text = (
+        f"<b>Приёмы пищи</b>\n"
+        f"{start.astimezone(MSK):%d.%m.%Y %H:%M}  —  {moscow_now():%d.%m.%Y %H:%M}\n\n"
+        + ("\n".join(lines) or "нет")
+    )
+
+    kb = InlineKeyboardBuilder()
+    nav_buttons = 0
+    if page.has_prev:
+        first = page.rows[0]
+        kb.button(text="◀️", callback_data=f"an_ml:{choice}:b:{ts_cursor(first[1], first[0])}")
+        nav_buttons += 1
+    if page.has_next:
+        last = page.rows[-1]
+        kb.button(text="▶️", callback_data=f"an_ml:{choice}:a:{ts_cursor(last[1], last[0])}")
+        nav_buttons += 1
+    kb.button(text="◀️ К статистике", callback_data=f"an_more_{choice}")
+    kb.button(text="Меню", callback_data="menu")
+    kb.adjust(*([nav_buttons] if nav_buttons else []), 1, 1)
+    await call.message.edit_text(text, reply_markup=kb.as_markup())
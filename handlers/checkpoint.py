@@ -4,34 +4,34 @@ from datetime import datetime
 from zoneinfo import ZoneInfo
 
 from aiogram import Router, F, types
-from sqlmodel import select
 
-from models_and_db import get_session, User, Checkpoint
+from models_and_db import get_async_session, User, Checkpoint
 from handlers.menu import menu_button
+from services.stats import invalidate_stats
 
 router = Router()
 MSK = ZoneInfo("Europe/Moscow")
 
 
 @router.callback_query(F.data == "add_checkpoint")
-async def add_checkpoint(call: types.CallbackQuery):
+async def add_checkpoint(call: types.CallbackQuery, user: User | None):
     """Создаёт чекпоинт с текущим МСК-временем и подтверждает пользователю."""
-    with get_session() as s:
-        user = s.exec(select(User).where(User.chat_id == call.from_user.id)).first()
-        if not user:
-            await call.message.answer("Сначала пройди регистрацию /start")
-            return
+    if not user:
+        await call.message.answer("Сначала пройди регистрацию /start")
+        return
 
+    async with get_async_session() as s:
         cp = Checkpoint(
             user_id=user.id,
             created_at=datetime.now(tz=MSK),  # aware-datetime в МСК
         )
         s.add(cp)
-        s.commit()
+        await s.commit()
 
         # Сохраняем время, пока объект привязан к сессии,
         # чтобы после выхода из контекста не словить DetachedInstanceError
         created_at_msk = cp.created_at
+    invalidate_stats(user.id)
 
     await call.message.edit_text(
         f"✅ Добавлен чекпоинт:\n{created_at_msk:%d.%m.%Y %H:%M}",
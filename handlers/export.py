@@ -0,0 +1,59 @@
+"""handlers/export.py — /export [csv|json]: вся история пользователя файлом"""
+
+import asyncio
+import logging
+from datetime import datetime
+
+from aiogram import Router, types
+from aiogram.filters import Command, CommandObject
+
+from config import settings
+from models_and_db import User
+from services.export import write_export
+
+router = Router()
+log = logging.getLogger(__name__)
+
+FORMAT_ALIASES = {"": "csv", "csv": "csv", "json": "ndjson", "ndjson": "ndjson"}
+
+# выгрузка читает всю историю — не больше EXPORT_CONCURRENCY потоков на процесс
+# и одна выгрузка на пользователя за раз
+_slots = asyncio.Semaphore(settings.EXPORT_CONCURRENCY)
+_running: set[int] = set()
+
+
+@router.message(Command("export"))
+async def export_history(msg: types.Message, command: CommandObject, user: User | None):
+    if not user:
+        await msg.answer("Сначала пройди регистрацию /start")
+        return
+
+    fmt = FORMAT_ALIASES.get((command.args or "").strip().lower())
+    if fmt is None:
+        await msg.answer("Формат: /export csv или /export json")
+        return
+    if user.id in _running:
+        await msg.answer("Выгрузка уже готовится, подожди немного ⏳")
+        return
+
+    _running.add(user.id)
+    try:
+        await msg.answer("⏳ Готовлю файл…")
+        async with _slots:
+            path, rows = await asyncio.to_thread(write_export, user.id, fmt)
+        try:
+            if path.stat().st_size > settings.EXPORT_MAX_MB * 2**20:
+                await msg.answer("Файл получился слишком большим для Telegram 😔")
+                return
+            name = f"history_{datetime.utcnow():%Y%m%d}.{'csv' if fmt == 'csv' else 'ndjson'}.gz"
+            await msg.answer_document(
+                types.FSInputFile(path, filename=name),
+                caption=f"Записей: {rows}",
+            )
+        finally:
+            path.unlink(missing_ok=True)
+    except Exception:
+        log.exception("export failed for user %s", user.id)
+        await msg.answer("Не удалось собрать выгрузку, попробуй позже 😔")
+    finally:
+        _running.discard(user.id)
@@ -3,29 +3,44 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone, time as dtime
-from math import ceil
 from zoneinfo import ZoneInfo
 
 from aiogram import Router, F, Bot, types
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlmodel import select, or_
 
 from models_and_db import (
-    get_session,
+    get_async_session,
+    get_read_session,
     User,
     Friend,
     FriendRequest,
-    Meal,
 )
 from handlers.analytics import calc_stats
 from handlers.menu import menu_button
+from services.leaderboard import LeaderRow, leaderboard
+from services.paging import seek_page
 
 router = Router()
 
 MSK = ZoneInfo("Europe/Moscow")
 PER_PAGE = 5  # друзей на страницу
+TOP_LIMIT = 50  # строк в рейтинге (своя строка показывается всегда)
+
+# рейтинг: период → (подпись, поле баланса, поле тренировок, поле веса)
+TOP_PERIODS = {
+    "d": ("сегодня", "day_balance", "day_workouts", "day_dw"),
+    "w": ("за 7 дней", "week_balance", "week_workouts", "week_dw"),
+}
+# сортировка: код → (подпись, номер поля периода, по убыванию)
+TOP_METRICS = {
+    "bal": ("баланс ккал", 0, False),
+    "cnt": ("тренировки", 1, True),
+    "w": ("вес", 2, False),
+}
 
 
 # ═════════════ FSM ═════════════
@@ -46,16 +61,6 @@ def today_interval() -> tuple[datetime, datetime]:
     return start_utc, end_utc
 
 
-def list_friends(user_id: int) -> list[User]:
-    with get_session() as s:
-        return s.exec(
-            select(User)
-            .join(Friend, Friend.friend_id == User.id)
-            .where(Friend.user_id == user_id)
-            .order_by(User.username)
-        ).all()
-
-
 def fmt(n: int | float) -> str:
     return f"{int(n):,}".replace(",", " ")
 
@@ -65,26 +70,55 @@ def to_msk(dt: datetime) -> datetime:
 
 
 # ═══════════ keyboards ═══════════
-def friends_page_kb(me_id: int, page: int = 0) -> types.InlineKeyboardMarkup:
-    friends = list_friends(me_id)
-    total_pages = max(1, ceil(len(friends) / PER_PAGE))
-    start, end = page * PER_PAGE, page * PER_PAGE + PER_PAGE
+async def friends_page_kb(
+    me_id: int, cursor: int | None = None, backward: bool = False
+) -> types.InlineKeyboardMarkup:
+    """Страница друзей в порядке friend_id; курсор — id крайнего друга.
+
+    Seek по индексу (user_id, friend_id): цена страницы не зависит от числа друзей.
+    """
+    async with get_read_session() as s:
+        page = await seek_page(
+            s,
+            select(User)
+            .join(Friend, Friend.friend_id == User.id)
+            .where(Friend.user_id == me_id),
+            [Friend.friend_id],
+            None if cursor is None else (cursor,),
+            backward=backward,
+            size=PER_PAGE,
+        )
 
     kb = InlineKeyboardBuilder()
-    for fr in friends[start:end]:
+    for fr in page.rows:
         kb.button(text=fr.username or str(fr.chat_id), callback_data=f"fr_view_{fr.id}")
 
-    if page > 0:
-        kb.button(text="◀️ Назад", callback_data=f"fr_page_{page-1}")
-    if page < total_pages - 1:
-        kb.button(text="Вперёд ▶️", callback_data=f"fr_page_{page+1}")
+    if page.has_prev:
+        kb.button(text="◀️ Назад", callback_data=f"fr_page_b_{page.rows[0].id}")
+    if page.has_next:
+        kb.button(text="Вперёд ▶️", callback_data=f"fr_page_a_{page.rows[-1].id}")
 
+    kb.button(text="🏆 Рейтинг", callback_data="fr_top_d_bal")
     kb.button(text="➕ Добавить друга", callback_data="fr_add")
     kb.button(text="🏠 Меню", callback_data="menu")
     kb.adjust(1)
     return kb.as_markup()
 
 
+def top_kb(period: str, metric: str) -> types.InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    for code, (label, *_) in TOP_PERIODS.items():
+        mark = "• " if code == period else ""
+        kb.button(text=f"{mark}{label.capitalize()}", callback_data=f"fr_top_{code}_{metric}")
+    for code, (label, *_) in TOP_METRICS.items():
+        mark = "• " if code == metric else ""
+        kb.button(text=f"{mark}{label.capitalize()}", callback_data=f"fr_top_{period}_{code}")
+    kb.button(text="◀️ Назад", callback_data="friends")
+    kb.button(text="🏠 Меню", callback_data="menu")
+    kb.adjust(2, 3, 1, 1)
+    return kb.as_markup()
+
+
 def confirm_kb(req_id: int) -> types.InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
     kb.button(text="✓ Принять", callback_data=f"fr_ok_{req_id}")
@@ -95,23 +129,68 @@ def confirm_kb(req_id: int) -> types.InlineKeyboardMarkup:
 
 # ═══════════ список / пагинация ═══════════
 @router.callback_query(F.data == "friends")
-async def friends_main(call: types.CallbackQuery):
-    with get_session() as s:
-        me = s.exec(select(User).where(User.chat_id == call.from_user.id)).first()
+async def friends_main(call: types.CallbackQuery, user: User | None):
+    if not user:
+        await call.answer("Сначала пройди регистрацию /start", show_alert=True)
+        return
 
     await call.message.edit_text(
         "<b>Друзья</b>\nВыберите друга, чтобы увидеть статистику:",
-        reply_markup=friends_page_kb(me.id, 0),
+        reply_markup=await friends_page_kb(user.id),
     )
 
 
 @router.callback_query(F.data.startswith("fr_page_"))
-async def friends_page(call: types.CallbackQuery):
-    page = int(call.data.split("_")[2])
-    with get_session() as s:
-        me = s.exec(select(User).where(User.chat_id == call.from_user.id)).first()
+async def friends_page(call: types.CallbackQuery, user: User | None):
+    if not user:
+        await call.answer("Сначала пройди регистрацию /start", show_alert=True)
+        return
+
+    # fr_page_{a|b}_{friend_id}; старые кнопки fr_page_{n} — первая страница
+    parts = call.data.split("_")
+    if len(parts) == 4 and parts[2] in ("a", "b") and parts[3].isdigit():
+        cursor, backward = int(parts[3]), parts[2] == "b"
+    else:
+        cursor, backward = None, False
+    await call.message.edit_reply_markup(
+        reply_markup=await friends_page_kb(user.id, cursor, backward=backward)
+    )
+
 
-    await call.message.edit_reply_markup(reply_markup=friends_page_kb(me.id, page))
+# ═══════════ рейтинг друзей ═══════════
+def top_text(rows: list[LeaderRow], me_id: int, period: str, metric: str) -> str:
+    title, *fields = TOP_PERIODS[period]
+    metric_title, idx, reverse = TOP_METRICS[metric]
+    bal_f, cnt_f, dw_f = fields
+    key = fields[idx]
+    rows = sorted(rows, key=lambda r: getattr(r, key), reverse=reverse)
+
+    lines = []
+    for place, r in enumerate(rows, 1):
+        if place > TOP_LIMIT and r.user_id != me_id:
+            continue
+        name = f"<b>{r.name} (ты)</b>" if r.user_id == me_id else r.name
+        lines.append(
+            f"{place}. {name} — {fmt(getattr(r, bal_f))} ккал · "
+            f"🏋️ {getattr(r, cnt_f)} · ⚖️ {getattr(r, dw_f):+.1f} кг"
+        )
+    return (
+        f"<b>Рейтинг друзей {title}</b>\n"
+        f"Сортировка: {metric_title}\n\n" + "\n".join(lines)
+    )
+
+
+@router.callback_query(F.data.startswith("fr_top_"))
+async def friends_top(call: types.CallbackQuery, user: User | None):
+    if not user:
+        await call.answer("Сначала пройди регистрацию /start", show_alert=True)
+        return
+
+    _, _, period, metric = call.data.split("_")      # fr_top_{d|w}_{bal|cnt|w}
+    rows = await leaderboard(user.id)
+    await call.message.edit_text(
+        top_text(rows, user.id, period, metric), reply_markup=top_kb(period, metric)
+    )
 
 
 # ═══════════ детальная статистика друга ═══════════
@@ -119,29 +198,18 @@ async def friends_page(call: types.CallbackQuery):
 async def friend_details(call: types.CallbackQuery):
     friend_id = int(call.data.split("_")[2])
 
-    with get_session() as s:
-        fr = s.get(User, friend_id)
+    async with get_read_session() as s:
+        fr = await s.get(User, friend_id)
     if not fr:
         await call.answer("Пользователь не найден.", show_alert=True)
         return
 
     start, end = today_interval()
-    stats = calc_stats(fr, start, end)
-
-    with get_session() as s:
-        meals = (
-            s.exec(
-                select(Meal)
-                .where(
-                    (Meal.user_id == fr.id) & (Meal.created_at.between(start, end))
-                )
-                .order_by(Meal.created_at)
-            ).all()
-        )
+    stats = await calc_stats(fr, start, end, with_meals=True)
     meals_block = (
         "\n".join(
-            f"• {to_msk(m.created_at):%H:%M} — {m.description} ({m.calories} ккал)"
-            for m in meals
+            f"• {to_msk(created_at):%H:%M} — {description} ({calories} ккал)"
+            for _, created_at, description, calories in stats["meal_rows"]
         )
         or "нет"
     )
@@ -178,7 +246,14 @@ async def ask_username(call: types.CallbackQuery, state: FSMContext):
 
 
 @router.message(FriendState.enter_username)
-async def process_username(msg: types.Message, state: FSMContext, bot: Bot):
+async def process_username(
+    msg: types.Message, state: FSMContext, bot: Bot, user: User | None
+):
+    if not user:
+        await msg.answer("Сначала пройди регистрацию /start")
+        await state.clear()
+        return
+
     raw = (msg.text or "").strip()
     uname = raw if raw.startswith("@") else f"@{raw}"
 
@@ -188,9 +263,9 @@ async def process_username(msg: types.Message, state: FSMContext, bot: Bot):
         return
 
     # попытка найти пользователя по username
-    with get_session() as s:
-        target_user = s.exec(
-            select(User).where(User.username.ilike(uname.lstrip("@")))
+    async with get_read_session() as s:
+        target_user = (
+            await s.exec(select(User).where(User.username.ilike(uname.lstrip("@"))))
         ).first()
 
     if target_user:
@@ -208,44 +283,45 @@ async def process_username(msg: types.Message, state: FSMContext, bot: Bot):
             await state.clear()
             return
 
-    with get_session() as s:
-        me = s.exec(select(User).where(User.chat_id == msg.from_user.id)).first()
-        target = s.exec(select(User).where(User.chat_id == target_chat_id)).first()
+    me = user
+    refusal = None
+    async with get_read_session() as s:
+        target = (await s.exec(select(User).where(User.chat_id == target_chat_id))).first()
 
         if not target:
-            await msg.answer(
-                "Этот пользователь ещё не запускал бота.", reply_markup=menu_button()
-            )
-            await state.clear()
-            return
-
+            refusal = "Этот пользователь ещё не запускал бота."
         # уже друзья?
-        if s.exec(
-            select(Friend).where(
-                (Friend.user_id == me.id) & (Friend.friend_id == target.id)
+        elif (
+            await s.exec(
+                select(Friend).where(
+                    (Friend.user_id == me.id) & (Friend.friend_id == target.id)
+                )
             )
         ).first():
-            await msg.answer("Вы уже друзья!", reply_markup=menu_button())
-            await state.clear()
-            return
-
+            refusal = "Вы уже друзья!"
         # ожидающий запрос?
-        if s.exec(
-            select(FriendRequest).where(
-                or_(
-                    (FriendRequest.from_id == me.id) & (FriendRequest.to_id == target.id),
-                    (FriendRequest.from_id == target.id) & (FriendRequest.to_id == me.id),
-                ),
-                FriendRequest.status == "pending",
+        elif (
+            await s.exec(
+                select(FriendRequest).where(
+                    or_(
+                        (FriendRequest.from_id == me.id) & (FriendRequest.to_id == target.id),
+                        (FriendRequest.from_id == target.id) & (FriendRequest.to_id == me.id),
+                    ),
+                    FriendRequest.status == "pending",
+                )
             )
         ).first():
-            await msg.answer("Уже есть ожидающий запрос.", reply_markup=menu_button())
-            await state.clear()
-            return
+            refusal = "Уже есть ожидающий запрос."
+
+    if refusal:
+        await msg.answer(refusal, reply_markup=menu_button())
+        await state.clear()
+        return
 
+    async with get_async_session() as s:
         req = FriendRequest(from_id=me.id, to_id=target.id)
         s.add(req)
-        s.commit()
+        await s.commit()
         req_id = req.id
 
     await msg.answer("Запрос отправлен!", reply_markup=menu_button())
@@ -262,22 +338,30 @@ async def process_username(msg: types.Message, state: FSMContext, bot: Bot):
 async def req_accept(call: types.CallbackQuery):
     req_id = int(call.data.split("_")[2])
 
-    with get_session() as s:
-        req = s.get(FriendRequest, req_id)
-        if not req or req.status != "pending":
-            await call.answer("Запрос устарел.", show_alert=True)
-            return
-
-        req.status = "accepted"
-        s.add_all(
-            [
-                Friend(user_id=req.from_id, friend_id=req.to_id),
-                Friend(user_id=req.to_id, friend_id=req.from_id),
-            ]
-        )
-        s.commit()
-        from_user = s.get(User, req.from_id)
+    # проверка и запись — одной транзакцией писателя; ответы Telegram — после неё
+    from_user = None
+    async with get_async_session() as s:
+        req = await s.get(FriendRequest, req_id)
+        if req and req.status == "pending":
+            from_user = await s.get(User, req.from_id)
+        if from_user is not None:
+            req.status = "accepted"
+            # пара могла появиться встречным запросом — уникальный индекс не роняет приём
+            await s.exec(
+                sqlite_insert(Friend)
+                .values(
+                    [
+                        {"user_id": req.from_id, "friend_id": req.to_id},
+                        {"user_id": req.to_id, "friend_id": req.from_id},
+                    ]
+                )
+                .on_conflict_do_nothing(index_elements=["user_id", "friend_id"])
+            )
+            await s.commit()
 
+    if from_user is None:
+        await call.answer("Запрос устарел.", show_alert=True)
+        return
     await call.message.edit_text("🚀 Вас добавили в друзья!", reply_markup=menu_button())
     await call.bot.send_message(
         from_user.chat_id, "✅ Ваш запрос дружбы принят!", reply_markup=menu_button()
@@ -288,11 +372,11 @@ async def req_accept(call: types.CallbackQuery):
 async def req_decline(call: types.CallbackQuery):
     req_id = int(call.data.split("_")[2])
 
-    with get_session() as s:
-        req = s.get(FriendRequest, req_id)
+    async with get_async_session() as s:
+        req = await s.get(FriendRequest, req_id)
         if req and req.status == "pending":
             req.status = "declined"
             s.add(req)
-            s.commit()
+            await s.commit()
 
     await call.message.edit_text("Запрос отклонён.", reply_markup=menu_button())
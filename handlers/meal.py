@@ -2,8 +2,6 @@
 
 from __future__ import annotations
 
-import asyncio
-import json
 import re
 from datetime import datetime
 from zoneinfo import ZoneInfo
@@ -12,42 +10,39 @@ from aiogram import Router, F, types
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from openai import AsyncOpenAI, OpenAIError
-from sqlmodel import select
-
-from config import settings
-from models_and_db import get_session, User, Meal
+from models_and_db import get_async_session, User, Meal
 from handlers.menu import menu_button
+from services import gpt_cache
+from services.estimator import estimate_meal
+from services.gpt_batcher import Batcher
+from services.gpt_client import GPTError
+from services.rollup import bump
+from services.stats import invalidate_stats
 
 router = Router()
 MSK = ZoneInfo("Europe/Moscow")
 
 # ------------- OpenAI -------------
-client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-
 GPT_SYSTEM = (
     "Ты нутрициолог. Пользователь описывает приём пищи. "
     "Верни JSON с полями food (строка) и calories (целое)."
 )
+batcher = Batcher(GPT_SYSTEM, op="meal", temperature=0.3)
 KCAL_RE = re.compile(r"(\d{2,4})\s*к?кал", re.I)
 DEFAULT_KCAL = 250
 
 
 async def gpt_estimate_meal(text: str) -> dict | None:
-    """Запрашивает GPT, возвращает dict {food, calories} либо None."""
+    """Запрашивает GPT (или кэш), возвращает dict {food, calories} либо None."""
+    key = gpt_cache.cache_key("meal", text, GPT_SYSTEM)
+    if (data := await gpt_cache.get(key)) is not None:
+        return data
     try:
-        resp = await client.chat.completions.create(
-            model=settings.GPT_MODEL,
-            response_format={"type": "json_object"},
-            temperature=0.3,
-            messages=[
-                {"role": "system", "content": GPT_SYSTEM},
-                {"role": "user", "content": text},
-            ],
-        )
-        return json.loads(resp.choices[0].message.content)
-    except (OpenAIError, json.JSONDecodeError, KeyError):
+        data = await batcher.submit(text)
+    except GPTError:
         return None
+    await gpt_cache.put(key, "meal", data)
+    return data
 
 
 # ------------- FSM -------------
@@ -91,15 +86,13 @@ async def process_desc(msg: types.Message, state: FSMContext):
         await msg.answer("Описание пустое 🤔 Попробуй ещё раз.")
         return
 
-    # GPT-оценка
-    data = await gpt_estimate_meal(text) or {}
-    calories = int(
-        abs(
-            data.get("calories")
-            or (m := KCAL_RE.search(text)) and m.group(1)
-            or DEFAULT_KCAL
-        )
-    )
+    # таблица калорийности → GPT → «N ккал» в тексте → типичные порции
+    data = estimate_meal(text) or await gpt_estimate_meal(text) or {}
+    if not data.get("calories") and (m := KCAL_RE.search(text)):
+        data = {**data, "calories": int(m.group(1))}
+    if not data.get("calories"):
+        data = estimate_meal(text, guess=True) or {}
+    calories = int(abs(data.get("calories") or DEFAULT_KCAL))
     food = data.get("food") or text.split(",")[0][:64]
 
     # сохраняем во временное состояние
@@ -122,22 +115,25 @@ async def cancel(call: types.CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(MealState.confirm, F.data == "meal_add")
-async def add(call: types.CallbackQuery, state: FSMContext):
+async def add(call: types.CallbackQuery, state: FSMContext, user: User | None):
+    if not user:
+        await call.message.answer("Сначала пройди регистрацию /start")
+        return
     data = await state.get_data()
     raw, food, calories = data["raw"], data["food"], data["calories"]
 
-    with get_session() as s:
-        user = s.exec(select(User).where(User.chat_id == call.from_user.id)).first()
-        s.add(
-            Meal(
-                user_id=user.id,
-                created_at=datetime.utcnow(),  # ← было datetime.now(tz=MSK)
-                raw_text=raw[:512],
-                description=food[:128],
-                calories=calories,
-            )
+    async with get_async_session() as s:
+        meal = Meal(
+            user_id=user.id,
+            created_at=datetime.utcnow(),  # ← было datetime.now(tz=MSK)
+            raw_text=raw[:512],
+            description=food[:128],
+            calories=calories,
         )
-        s.commit()
+        s.add(meal)
+        await bump(s, user.id, meal.created_at, kcal_in=calories)
+        await s.commit()
+    invalidate_stats(user.id)
 
     await call.message.edit_text(
         f"🍽️ Приём пищи добавлен!\n<i>{food}</i>: <b>{calories} кКал</b>",
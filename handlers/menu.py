@@ -4,6 +4,8 @@ from aiogram import Router, F, types
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.filters import Command             # ← фильтр команд
 
+from services import streaming
+
 router = Router()
 
 
@@ -30,9 +32,11 @@ def menu_button() -> types.InlineKeyboardMarkup:
 # ───────────── handlers ─────────────
 @router.callback_query(F.data == "menu")
 async def menu_callback(call: types.CallbackQuery):
+    streaming.cancel(call.message.chat.id)          # останавливаем ответ ИИ, если идёт
     await call.message.edit_text("Главное меню", reply_markup=main_menu_kb())
 
 
 @router.message(Command("menu"))          # ← /menu
 async def menu_cmd(msg: types.Message):
+    streaming.cancel(msg.chat.id)
     await msg.answer("Главное меню", reply_markup=main_menu_kb())
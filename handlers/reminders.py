@@ -0,0 +1,90 @@
+"""handlers/reminders.py — часовой пояс и время утренних/вечерних напоминаний"""
+
+import re
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from aiogram import Router, types
+from aiogram.filters import Command, CommandObject
+
+from models_and_db import get_async_session, User
+from handlers.menu import menu_button
+from middlewares.user import user_cache
+from utils.time import hhmm, utc_minute_of_day
+
+router = Router()
+
+TIME_RE = re.compile(r"(\d{1,2})[:.](\d{2})")
+
+
+def reminders_text(user: User) -> str:
+    return (
+        "<b>Напоминания</b>\n"
+        f"Часовой пояс: {user.tz}\n"
+        f"Утро: {hhmm(user.morning_min)}\n"
+        f"Вечер: {hhmm(user.evening_min)}\n\n"
+        "Изменить пояс: /tz Europe/Berlin\n"
+        "Изменить время: /remind 07:00 22:30"
+    )
+
+
+def _parse_minutes(raw: str) -> int | None:
+    m = TIME_RE.fullmatch(raw)
+    if not m:
+        return None
+    h, mm = int(m.group(1)), int(m.group(2))
+    return h * 60 + mm if h < 24 and mm < 60 else None
+
+
+async def _update_user(user: User, **fields) -> User:
+    """Меняет поля пользователя и пересчитывает UTC-корзины напоминаний."""
+    async with get_async_session() as s:
+        user = await s.get(User, user.id)
+        for name, value in fields.items():
+            setattr(user, name, value)
+        user.morning_utc_min = utc_minute_of_day(user.tz, user.morning_min)
+        user.evening_utc_min = utc_minute_of_day(user.tz, user.evening_min)
+        s.add(user)
+        await s.commit()
+    user_cache.put(user)
+    return user
+
+
+@router.message(Command("reminders"))
+async def show_reminders(msg: types.Message, user: User | None):
+    if not user:
+        await msg.answer("Сначала пройди регистрацию /start")
+        return
+    await msg.answer(reminders_text(user), reply_markup=menu_button())
+
+
+@router.message(Command("tz"))
+async def set_tz(msg: types.Message, command: CommandObject, user: User | None):
+    if not user:
+        await msg.answer("Сначала пройди регистрацию /start")
+        return
+
+    tz = (command.args or "").strip()
+    try:
+        ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        await msg.answer("Не знаю такой пояс 🤔 Пример: /tz Europe/Moscow")
+        return
+
+    user = await _update_user(user, tz=tz)
+    await msg.answer(reminders_text(user), reply_markup=menu_button())
+
+
+@router.message(Command("remind"))
+async def set_remind(msg: types.Message, command: CommandObject, user: User | None):
+    if not user:
+        await msg.answer("Сначала пройди регистрацию /start")
+        return
+
+    parts = (command.args or "").split()
+    minutes = [_parse_minutes(p) for p in parts]
+    if len(minutes) != 2 or None in minutes:
+        await msg.answer("Формат: /remind 07:00 22:30 (утро и вечер)")
+        return
+
+    user = await _update_user(user, morning_min=minutes[0], evening_min=minutes[1])
+    await msg.answer(reminders_text(user), reply_markup=menu_button())
@@ -3,10 +3,10 @@ from datetime import datetime
 from aiogram import Router, types, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from sqlmodel import select
 
-from models_and_db import get_session, User
+from models_and_db import get_async_session, User
 from handlers.menu import menu_button
+from middlewares.user import user_cache
 
 router = Router()
 
@@ -78,7 +78,7 @@ async def reg_w(msg: types.Message, state: FSMContext):
 
 
 @router.message(Reg.gender, F.text.in_(["Мужской", "Женский"]))
-async def reg_gender(msg: types.Message, state: FSMContext):
+async def reg_gender(msg: types.Message, state: FSMContext, user: User | None):
     data = await state.get_data()
     age = data["age"]
     height = data["height"]
@@ -88,9 +88,9 @@ async def reg_gender(msg: types.Message, state: FSMContext):
     bmi = calc_bmi(weight, height)
     tdee = calc_tdee(weight, height, age, gender)
 
-    with get_session() as s:
-        user = s.exec(select(User).where(User.chat_id == msg.from_user.id)).first()
+    async with get_async_session() as s:
         if user:
+            user = await s.get(User, user.id)
             # обновляем
             user.age = age
             user.height_cm = height
@@ -101,19 +101,19 @@ async def reg_gender(msg: types.Message, state: FSMContext):
             user.username = msg.from_user.username  # ← сохраняем username
             s.add(user)
         else:
-            s.add(
-                User(
-                    chat_id=msg.from_user.id,
-                    username=msg.from_user.username,  # ← сохраняем username
-                    age=age,
-                    height_cm=height,
-                    weight_kg=weight,
-                    gender=gender,
-                    bmi=bmi,
-                    tdee=tdee,
-                )
+            user = User(
+                chat_id=msg.from_user.id,
+                username=msg.from_user.username,  # ← сохраняем username
+                age=age,
+                height_cm=height,
+                weight_kg=weight,
+                gender=gender,
+                bmi=bmi,
+                tdee=tdee,
             )
-        s.commit()
+            s.add(user)
+        await s.commit()
+    user_cache.put(user)
 
     await msg.answer(
         f"Регистрация завершена!\nИМТ: {bmi}\nTDEE: {tdee} ккал/день",
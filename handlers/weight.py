@@ -4,12 +4,14 @@ from aiogram import Router, F, types
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 
-from sqlmodel import select
 from datetime import datetime
 import re
 
-from models_and_db import get_session, User, Weight
+from models_and_db import get_async_session, User, Weight
 from handlers.menu import menu_button
+from middlewares.user import user_cache
+from services.rollup import bump
+from services.stats import invalidate_stats
 
 router = Router()
 
@@ -30,7 +32,7 @@ async def ask_weight(call: types.CallbackQuery, state: FSMContext):
 
 
 @router.message(WeightState.waiting_weight)
-async def save_weight(msg: types.Message, state: FSMContext):
+async def save_weight(msg: types.Message, state: FSMContext, user: User | None):
     text = msg.text or ""
     m = WEIGHT_PATTERN.search(text)
     if not m:
@@ -40,30 +42,33 @@ async def save_weight(msg: types.Message, state: FSMContext):
     weight_kg = float(m.group(1).replace(",", "."))
     weight_kg = round(weight_kg, 1)
 
-    with get_session() as session:
-        user = session.exec(select(User).where(User.chat_id == msg.from_user.id)).first()
-        if not user:
-            await msg.answer("Сначала пройди регистрацию /start")
-            return
+    if not user:
+        await msg.answer("Сначала пройди регистрацию /start")
+        return
+
+    async with get_async_session() as session:
+        user = await session.get(User, user.id)
 
         # вычисляем BMI (простая формула) — может быть None, т.к. рост не меняем
         bmi = round(weight_kg / (user.height_cm / 100) ** 2, 1)
 
-        session.add(
-            Weight(
-                user_id=user.id,
-                weight_kg=weight_kg,
-                bmi=bmi,
-                created_at=datetime.utcnow(),
-            )
+        entry = Weight(
+            user_id=user.id,
+            weight_kg=weight_kg,
+            bmi=bmi,
+            created_at=datetime.utcnow(),
         )
+        session.add(entry)
+        await bump(session, user.id, entry.created_at, weight=weight_kg)
 
         # обновляем текущий вес пользователя
         user.weight_kg = weight_kg
         user.bmi = bmi
         session.add(user)
 
-        session.commit()
+        await session.commit()
+    user_cache.put(user)
+    invalidate_stats(user.id)
 
     await msg.answer(
         f"✅ Вес обновлён: {weight_kg} кг (ИМТ {bmi})", reply_markup=menu_button()
@@ -1,22 +1,21 @@
-"""handlers/workout.py — добавление тренировки, GPT-оценка калорий"""
+"""handlers/workout.py — добавление тренировки: MET-таблица, затем GPT-оценка калорий"""
 
-import asyncio
-import json
 import re
 from datetime import datetime
 
 from aiogram import Router, F, types
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from sqlmodel import select
-from openai import OpenAI, OpenAIError
-
-from config import settings
-from models_and_db import get_session, User, Workout
+from models_and_db import get_async_session, User, Workout
 from handlers.menu import menu_button
+from services import gpt_cache
+from services.estimator import estimate_workout
+from services.gpt_batcher import Batcher
+from services.gpt_client import GPTError
+from services.rollup import bump
+from services.stats import invalidate_stats
 
 router = Router()
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
 # ────────────── FSM ──────────────
 class WorkoutState(StatesGroup):
@@ -28,31 +27,22 @@ GPT_SYSTEM = (
     "Ты спортивный эксперт. Пользователь описывает тренировку. "
     "Верни JSON c полями type (строка), duration_min (int), calories (int)."
 )
+batcher = Batcher(GPT_SYSTEM, op="workout", temperature=0.2)
 DURATION_RE = re.compile(r"(\d+)\s*(?:мин|minutes?|м|минут)")
 DEFAULT_MIN = 90
 DEFAULT_KCAL = 250
 
 
 async def gpt_estimate(text: str) -> dict | None:
-    loop = asyncio.get_running_loop()
-
-    def _ask():
-        return client.chat.completions.create(
-            model=settings.GPT_MODEL,
-            temperature=0.2,
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": GPT_SYSTEM},
-                {"role": "user", "content": text},
-            ],
-        )
-
+    key = gpt_cache.cache_key("workout", text, GPT_SYSTEM)
+    if (data := await gpt_cache.get(key)) is not None:
+        return data
     try:
-        resp = await loop.run_in_executor(None, _ask)
-        raw_json = resp.choices[0].message.content
-        return json.loads(raw_json)
-    except (OpenAIError, json.JSONDecodeError, KeyError):
+        data = await batcher.submit(text)
+    except GPTError:
         return None
+    await gpt_cache.put(key, "workout", data)
+    return data
 
 
 # ────────────── handlers ──────────────
@@ -66,40 +56,45 @@ async def ask_desc(call: types.CallbackQuery, state: FSMContext):
 
 
 @router.message(WorkoutState.desc)
-async def process_desc(msg: types.Message, state: FSMContext):
+async def process_desc(msg: types.Message, state: FSMContext, user: User | None):
     desc = (msg.text or "").strip()
     if not desc:
         await msg.answer("Описание пустое 🤔 Попробуй ещё раз.")
         return
 
-    with get_session() as s:
-        user = s.exec(select(User).where(User.chat_id == msg.from_user.id)).first()
-        if not user:
-            await msg.answer("Сначала пройди регистрацию /start")
-            return
+    if not user:
+        await msg.answer("Сначала пройди регистрацию /start")
+        return
+
+    # MET-таблица → GPT → грубая оценка по MET с допущениями
+    data, method = estimate_workout(desc, user.weight_kg), "local"
+    if data is None:
+        data, method = await gpt_estimate(desc), "gpt"
+    if not data:
+        data, method = estimate_workout(desc, user.weight_kg, guess=True), "fallback"
 
-    data = await gpt_estimate(desc)
-    workout_type = (data or {}).get("type") or desc.split()[0].lower()
+    workout_type = data.get("type") or desc.split()[0].lower()
     duration = int(
-        (data or {}).get("duration_min")
+        data.get("duration_min")
         or (DURATION_RE.search(desc) and DURATION_RE.search(desc).group(1))
         or DEFAULT_MIN
     )
-    calories = int(abs((data or {}).get("calories") or DEFAULT_KCAL))
-
-    with get_session() as s:
-        s.add(
-            Workout(
-                user_id=user.id,
-                created_at=datetime.utcnow(),
-                raw_text=desc[:512],
-                type=workout_type[:64],
-                duration_min=duration,
-                calories=-calories,  # отрицательное → расход
-                method="gpt" if data else "fallback",
-            )
+    calories = int(abs(data.get("calories") or DEFAULT_KCAL))
+
+    async with get_async_session() as s:
+        workout = Workout(
+            user_id=user.id,
+            created_at=datetime.utcnow(),
+            raw_text=desc[:512],
+            type=workout_type[:64],
+            duration_min=duration,
+            calories=-calories,  # отрицательное → расход
+            method=method,
         )
-        s.commit()
+        s.add(workout)
+        await bump(s, user.id, workout.created_at, kcal_out=-calories, workouts=1)
+        await s.commit()
+    invalidate_stats(user.id)
 
     await msg.answer(
         f"✅ Тренировка добавлена!\n"
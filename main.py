@@ -1,6 +1,7 @@
 """
 main.py — точка входа: создание бота, диспетчера, команд, планировщика,
-          подключение всех роутеров и запуск polling
+          подключение всех роутеров и запуск polling или webhook
+          (WORKERS > 1 — супервизор с процессами-воркерами, supervisor.py)
 """
 
 import asyncio
@@ -11,7 +12,12 @@ from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
 from config import settings
+from middlewares import metrics as metrics_mw
+from middlewares.user import UserMiddleware
+from services import metrics
+from services.fsm_storage import make_storage
 from scheduler import make_scheduler                          # планировщик напоминаний
+from webhook import run_webhook
 
 # ─────── настройка логов ───────
 logging.basicConfig(
@@ -25,19 +31,24 @@ async def set_commands(bot: Bot):
         [
             types.BotCommand(command="start", description="Запустить / перезапустить бота"),
             types.BotCommand(command="menu",  description="Главное меню"),
+            types.BotCommand(command="reminders", description="Время напоминаний и часовой пояс"),
+            types.BotCommand(command="export", description="Выгрузить историю файлом (csv/json)"),
         ]
     )
 
 
-async def main():
-    # 1. Бот и диспетчер
-    bot = Bot(
-        token=settings.BOT_TOKEN,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
-    )
-    dp = Dispatcher()
+def build_dispatcher(
+    *, scheduler: bool = True, metrics_port: int = settings.METRICS_PORT
+) -> Dispatcher:
+    """Диспетчер со всеми роутерами и middleware.
+
+    scheduler=False — без команд и планировщика (воркеры supervisor.py, кроме 0).
+    metrics_port=0 — без HTTP-эндпоинта /metrics (замеры всё равно идут).
+    """
+    dp = Dispatcher(storage=make_storage())       # FSM переживает рестарт
+    metrics_mw.setup(dp)                           # время хендлеров и SQL на апдейт
+    dp.update.outer_middleware(UserMiddleware())   # data["user"] для всех хендлеров
 
-    # 2. Роутеры
     from handlers.start import router as start_router
     from handlers.menu import router as menu_router
     from handlers.workout import router as workout_router
@@ -47,6 +58,8 @@ async def main():
     from handlers.ai_help import router as ai_router
     from handlers.analytics import router as analytics_router
     from handlers.friends import router as friends_router
+    from handlers.reminders import router as reminders_router
+    from handlers.export import router as export_router
 
     dp.include_router(start_router)
     dp.include_router(menu_router)
@@ -57,22 +70,65 @@ async def main():
     dp.include_router(ai_router)
     dp.include_router(analytics_router)
     dp.include_router(friends_router)
+    dp.include_router(reminders_router)
+    dp.include_router(export_router)
+
+    if scheduler:
+        dp.startup.register(on_startup)
+        dp.shutdown.register(on_shutdown)
+    if metrics_port:
+        dp["metrics_port"] = metrics_port
+        dp.startup.register(start_metrics)
+        dp.shutdown.register(stop_metrics)
+    return dp
 
-    # 3. slash-команды
-    await set_commands(bot)
 
-    # 4. планировщик ежедневных сообщений
-    loop = asyncio.get_running_loop()
-    scheduler = make_scheduler(bot, loop)
+async def on_startup(bot: Bot, dispatcher: Dispatcher):
+    # slash-команды и планировщик ежедневных сообщений
+    await set_commands(bot)
+    scheduler = make_scheduler(bot, asyncio.get_running_loop())
     scheduler.start()
+    dispatcher["scheduler"] = scheduler
+
+
+async def on_shutdown(dispatcher: Dispatcher):
+    if scheduler := dispatcher.workflow_data.pop("scheduler", None):
+        scheduler.shutdown(wait=False)
+
+
+async def start_metrics(dispatcher: Dispatcher, metrics_port: int):
+    dispatcher["metrics_runner"] = await metrics.start_server(metrics_port)
+
+
+async def stop_metrics(dispatcher: Dispatcher):
+    if runner := dispatcher.workflow_data.pop("metrics_runner", None):
+        await runner.cleanup()
+
+
+async def main():
+    # 1. Бот и диспетчер
+    bot = Bot(
+        token=settings.BOT_TOKEN,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+    dp = build_dispatcher()
 
-    # 5. запуск long-polling
-    logging.info("Starting bot…")
-    await dp.start_polling(bot)
+    # 2. запуск: webhook или long-polling
+    if settings.RUN_MODE == "webhook":
+        logging.info("Starting bot (webhook)…")
+        await run_webhook(bot, dp)
+    else:
+        logging.info("Starting bot…")
+        await bot.delete_webhook()                # иначе getUpdates вернёт 409
+        await dp.start_polling(bot)
 
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        if settings.WORKERS > 1:
+            from supervisor import supervise
+            asyncio.run(supervise())
+        else:
+            asyncio.run(main())
     except (KeyboardInterrupt, SystemExit):
         logging.info("Bot stopped.")
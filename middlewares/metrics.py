@@ -0,0 +1,102 @@
+"""middlewares/metrics.py — время хендлеров и SQL-запросы на апдейт
+
+UpdateMetricsMiddleware (outer, на dp.update, раньше UserMiddleware)
+открывает пробу апдейта (services.metrics.current_probe) и по
+завершении пишет полное время и число/время SQL-запросов.
+HandlerMetricsMiddleware (inner, на message и callback_query
+диспетчера — действует на все роутеры) узнаёт, какой хендлер сработал,
+и замеряет его отдельно.
+
+Запросы считаются хуками SQLAlchemy на движках models_and_db: курсор
+исполняется в greenlet с тем же контекстом, поэтому запрос попадает в
+пробу своего апдейта. Запросы вне апдейтов (планировщик) не считаются.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from sqlalchemy import event
+
+from models_and_db import SYNC_ENGINES
+from services.metrics import (
+    DB_QUERIES,
+    DB_SECONDS,
+    HANDLER_SECONDS,
+    UPDATE_SECONDS,
+    UpdateProbe,
+    current_probe,
+)
+
+
+# ─────────────────────── SQL ───────────────────────
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if (probe := current_probe.get()) is not None:
+        probe.queries += 1
+        context._metrics_started = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    if (probe := current_probe.get()) is not None and hasattr(context, "_metrics_started"):
+        probe.db_seconds += time.perf_counter() - context._metrics_started
+
+
+for _engine in SYNC_ENGINES:
+    event.listen(_engine, "before_cursor_execute", _before_execute)
+    event.listen(_engine, "after_cursor_execute", _after_execute)
+
+
+# ─────────────────────── middleware ───────────────────────
+def handler_name(callback: Callable) -> str:
+    """«meal.process_desc» — модуль без пакета и имя функции."""
+    return f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        probe = UpdateProbe()
+        token = current_probe.set(probe)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            current_probe.reset(token)
+            UPDATE_SECONDS.observe(
+                time.perf_counter() - started, event=event.event_type, handler=probe.handler
+            )
+            DB_QUERIES.observe(probe.queries, handler=probe.handler)
+            DB_SECONDS.observe(probe.db_seconds, handler=probe.handler)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    def __init__(self, event_type: str):
+        self.event_type = event_type
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        name = handler_name(data["handler"].callback)
+        if (probe := current_probe.get()) is not None:
+            probe.handler = name
+        with HANDLER_SECONDS.time(event=self.event_type, handler=name, status="error") as labels:
+            result = await handler(event, data)
+            labels["status"] = "ok"
+        return result
+
+
+def setup(dp) -> None:
+    """Вешает оба middleware; вызывать до UserMiddleware, чтобы учесть и его запросы."""
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.message.middleware(HandlerMetricsMiddleware("message"))
+    dp.callback_query.middleware(HandlerMetricsMiddleware("callback_query"))
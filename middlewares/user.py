@@ -0,0 +1,75 @@
+"""middlewares/user.py — текущий User один раз на апдейт, с кэшем в памяти
+
+UserMiddleware (outer, на dp.update) кладёт в data["user"] строку User
+по chat_id отправителя либо None, если пользователь не зарегистрирован.
+Хендлеры получают её аргументом `user`.
+
+Кэш — utils.ttl_cache.TTLCache по chat_id; хендлеры, меняющие строку
+User, обязаны вызвать user_cache.put(...) или user_cache.invalidate(...).
+Незарегистрированные chat_id тоже кэшируются (None на USER_MISSING_TTL
+секунд): спам /start до регистрации не ходит в БД на каждый апдейт.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy import update
+from sqlmodel import select
+
+from config import settings
+from models_and_db import get_async_session, get_read_session, User
+from utils.ttl_cache import TTLCache
+
+
+class UserCache(TTLCache):
+    """chat_id → User; None — «не зарегистрирован» на USER_MISSING_TTL секунд."""
+
+    def put(self, user: User) -> None:
+        super().put(user.chat_id, user)
+
+    def put_missing(self, chat_id: int) -> None:
+        super().put(chat_id, None, settings.USER_MISSING_TTL)
+
+    def invalidate(self, chat_id: int) -> None:
+        self.pop(chat_id)
+
+
+user_cache = UserCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+_UNKNOWN = object()                              # нет записи в кэше (в отличие от None)
+
+
+async def _unblock(user: User) -> None:
+    """Пишет нам — значит, бота разблокировал."""
+    user.is_blocked = False
+    async with get_async_session() as s:
+        await s.exec(update(User).where(User.id == user.id).values(is_blocked=False))
+        await s.commit()
+
+
+async def get_user(chat_id: int) -> User | None:
+    user = user_cache.get(chat_id, _UNKNOWN)
+    if user is _UNKNOWN:
+        async with get_read_session() as s:
+            user = (await s.exec(select(User).where(User.chat_id == chat_id))).first()
+        if user is None:
+            user_cache.put_missing(chat_id)
+            return None
+        user_cache.put(user)
+    if user is not None and user.is_blocked:
+        await _unblock(user)                    # и для записи из кэша
+    return user
+
+
+class UserMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        tg_user = data.get("event_from_user")
+        data["user"] = await get_user(tg_user.id) if tg_user else None
+        return await handler(event, data)
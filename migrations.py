@@ -0,0 +1,124 @@
+"""migrations.py — версионные миграции схемы SQLite
+
+`create_all()` создаёт только отсутствующие таблицы и не трогает уже
+существующие, поэтому новые индексы и колонки для живой fitness.db
+докатываются здесь. Текущая версия схемы хранится в PRAGMA user_version.
+
+Чтобы добавить миграцию — допиши функцию в конец MIGRATIONS.
+Каждая миграция должна быть идемпотентной (IF NOT EXISTS / проверка
+колонки), потому что на свежей базе create_all уже всё создал.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Callable
+
+from sqlalchemy import Connection, Engine
+
+from config import settings
+
+log = logging.getLogger(__name__)
+
+Migration = Callable[[Connection], None]
+
+
+# ─────────────────────── helpers ───────────────────────
+def _has_column(conn: Connection, table: str, column: str) -> bool:
+    rows = conn.exec_driver_sql(f'PRAGMA table_info("{table}")').all()
+    return any(r[1] == column for r in rows)
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str) -> None:
+    """ALTER TABLE … ADD COLUMN, если колонки ещё нет."""
+    if not _has_column(conn, table, column):
+        conn.exec_driver_sql(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}')
+
+
+# ────────────────────── миграции ──────────────────────
+def _m001_user_created_indexes(conn: Connection) -> None:
+    """Составные индексы (user_id, created_at) + уникальность дружбы."""
+    for table in ("meal", "workout", "weight", "checkpoint"):
+        conn.exec_driver_sql(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_user_created "
+            f'ON "{table}" (user_id, created_at)'
+        )
+
+    # старые дубликаты дружбы не дадут построить уникальный индекс
+    conn.exec_driver_sql(
+        "DELETE FROM friend WHERE id NOT IN "
+        "(SELECT MIN(id) FROM friend GROUP BY user_id, friend_id)"
+    )
+    conn.exec_driver_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_friend_user_friend "
+        "ON friend (user_id, friend_id)"
+    )
+
+
+def rebuild_daily_totals(conn: Connection) -> None:
+    """Пересобирает dailytotals целиком из meal / workout / weight."""
+    day = f"date(created_at, '{settings.TZ_OFFSET_HOURS:+d} hours')"
+    conn.exec_driver_sql("DELETE FROM dailytotals")
+    conn.exec_driver_sql(
+        "INSERT INTO dailytotals (user_id, day, kcal_in, kcal_out, workouts_cnt) "
+        f"SELECT user_id, {day}, SUM(calories), 0, 0 FROM meal "
+        f"GROUP BY user_id, {day}"
+    )
+    # WHERE true — обязателен в SQLite для INSERT … SELECT … ON CONFLICT
+    conn.exec_driver_sql(
+        "INSERT INTO dailytotals (user_id, day, kcal_in, kcal_out, workouts_cnt) "
+        f"SELECT user_id, {day}, 0, SUM(calories), COUNT(*) FROM workout WHERE true "
+        f"GROUP BY user_id, {day} "
+        "ON CONFLICT (user_id, day) DO UPDATE SET "
+        "kcal_out = excluded.kcal_out, workouts_cnt = excluded.workouts_cnt"
+    )
+    # bare column + MAX(): SQLite берёт weight_kg из строки с последним created_at
+    conn.exec_driver_sql(
+        "INSERT INTO dailytotals (user_id, day, kcal_in, kcal_out, workouts_cnt, last_weight) "
+        f"SELECT user_id, {day}, 0, 0, 0, weight_kg FROM "
+        f"(SELECT user_id, created_at, weight_kg, MAX(created_at) FROM weight "
+        f"GROUP BY user_id, {day}) WHERE true "
+        "ON CONFLICT (user_id, day) DO UPDATE SET last_weight = excluded.last_weight"
+    )
+
+
+def _m003_user_is_blocked(conn: Connection) -> None:
+    _add_column(conn, "user", "is_blocked", "BOOLEAN NOT NULL DEFAULT 0")
+
+
+def _m004_user_reminders(conn: Connection) -> None:
+    """Часовой пояс и время напоминаний; по умолчанию 06:00 / 22:00 МСК."""
+    _add_column(conn, "user", "tz", "VARCHAR NOT NULL DEFAULT 'Europe/Moscow'")
+    _add_column(conn, "user", "morning_min", "INTEGER NOT NULL DEFAULT 360")
+    _add_column(conn, "user", "evening_min", "INTEGER NOT NULL DEFAULT 1320")
+    _add_column(conn, "user", "morning_utc_min", "INTEGER NOT NULL DEFAULT 180")
+    _add_column(conn, "user", "evening_utc_min", "INTEGER NOT NULL DEFAULT 1140")
+    for column in ("morning_utc_min", "evening_utc_min"):
+        conn.exec_driver_sql(
+            f'CREATE INDEX IF NOT EXISTS ix_user_{column} ON "user" ({column})'
+        )
+
+
+MIGRATIONS: list[Migration] = [
+    _m001_user_created_indexes,
+    rebuild_daily_totals,           # 002: заполняем rollup по старым данным
+    _m003_user_is_blocked,
+    _m004_user_reminders,
+]
+
+
+# ─────────────────────── runner ───────────────────────
+def run_migrations(engine: Engine) -> int:
+    """Применяет недостающие миграции, возвращает итоговую версию схемы."""
+    with engine.connect() as conn:
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        # каждая миграция — отдельная транзакция вместе с номером версии
+        with engine.begin() as conn:
+            migration(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {number}")
+        log.info("DB migration %s applied: %s", number, migration.__name__)
+        version = number
+
+    return version
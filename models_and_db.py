@@ -1,19 +1,91 @@
 """models_and_db.py — схема БД + удобный геттер сессии
     ▸ добавлены таблицы FriendRequest и Friend
+    ▸ профиль DB_PROFILE=wal: один пишущий + пул читающих соединений
 """
 
 from __future__ import annotations
 
-from contextlib import contextmanager
-from datetime import datetime
+from contextlib import asynccontextmanager, contextmanager
+from datetime import date, datetime
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Optional
 
+from sqlalchemy import Index, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlmodel import Field, SQLModel, Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config import settings
+from migrations import run_migrations
+from services.slow_queries import slow_log
 
 # ──────────────────── конфиг SQLite ────────────────────
-DB_PATH = Path(__file__).with_name("fitness.db")
-engine = create_engine(f"sqlite:///{DB_PATH}", echo=False)   # echo=True для отладки
+DB_PATH = Path(__file__).parent / settings.DB_PATH   # относительный — от папки проекта
+WAL = settings.DB_PROFILE == "wal"
+engine = create_engine(f"sqlite:///{DB_PATH}", echo=settings.DB_ECHO)   # DB_ECHO=1 для отладки
+
+# асинхронный движок для хендлеров: запросы не блокируют event-loop.
+# wal: все записи процесса идут через одно соединение (SQLite всё равно
+# пишет по одному, а очередь в пуле дешевле, чем «database is locked»),
+# чтение — через отдельный пул query_only-соединений, которые в WAL не
+# мешают писателю. legacy: как раньше, общий пул на всё.
+async_engine = create_async_engine(
+    f"sqlite+aiosqlite:///{DB_PATH}",
+    echo=settings.DB_ECHO,
+    pool_size=1 if WAL else settings.DB_POOL_SIZE,
+    max_overflow=0 if WAL else settings.DB_POOL_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+)
+read_engine = (
+    create_async_engine(
+        f"sqlite+aiosqlite:///{DB_PATH}",
+        echo=settings.DB_ECHO,
+        pool_size=settings.DB_READ_POOL_SIZE,
+        max_overflow=0,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+    if WAL
+    else async_engine
+)
+# все синхронные движки — для хуков (метрики, журнал медленных запросов)
+SYNC_ENGINES = list(dict.fromkeys([engine, async_engine.sync_engine, read_engine.sync_engine]))
+
+
+def _pragmas(*, read_only: bool) -> list[str]:
+    pragmas = [
+        f"PRAGMA busy_timeout={settings.DB_BUSY_TIMEOUT_MS}",
+        "PRAGMA synchronous=NORMAL",             # WAL: сбой питания — максимум последний коммит
+        f"PRAGMA cache_size={-settings.DB_CACHE_MB * 1024}",
+        f"PRAGMA mmap_size={settings.DB_MMAP_MB * 2**20}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    return pragmas + ["PRAGMA query_only=ON"] if read_only else pragmas
+
+
+def _on_connect(pragmas: list[str]):
+    def apply(dbapi_connection, _record) -> None:
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return apply
+
+
+if WAL:
+    for _engine in (engine, async_engine.sync_engine):
+        event.listen(_engine, "connect", _on_connect(_pragmas(read_only=False)))
+    event.listen(read_engine.sync_engine, "connect", _on_connect(_pragmas(read_only=True)))
+
+slow_log.install(*SYNC_ENGINES)   # SLOW_QUERY_MS, топ форм в лог
+
+# expire_on_commit=False — объекты можно читать после commit без lazy-load
+async_session_factory = async_sessionmaker(
+    async_engine, class_=AsyncSession, expire_on_commit=False
+)
+read_session_factory = async_sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False
+)
 
 
 # ─────────────────────── MODELS ────────────────────────
@@ -28,10 +100,20 @@ class User(SQLModel, table=True):
     gender: str
     bmi: float
     tdee: int
+    is_blocked: bool = Field(default=False)   # заблокировал бота → не рассылаем
+
+    # напоминания: локальное время (минуты от полуночи) и его UTC-корзина
+    tz: str = Field(default="Europe/Moscow")
+    morning_min: int = Field(default=6 * 60)
+    evening_min: int = Field(default=22 * 60)
+    morning_utc_min: int = Field(default=3 * 60, index=True)
+    evening_utc_min: int = Field(default=19 * 60, index=True)
 
 
 
 class Workout(SQLModel, table=True):
+    __table_args__ = (Index("ix_workout_user_created", "user_id", "created_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -39,10 +121,12 @@ class Workout(SQLModel, table=True):
     type: str
     duration_min: int
     calories: int                            # всегда <0
-    method: str                              # gpt|fallback|user
+    method: str                              # local|gpt|fallback|user
 
 
 class Meal(SQLModel, table=True):
+    __table_args__ = (Index("ix_meal_user_created", "user_id", "created_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -52,6 +136,8 @@ class Meal(SQLModel, table=True):
 
 
 class Weight(SQLModel, table=True):
+    __table_args__ = (Index("ix_weight_user_created", "user_id", "created_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -60,11 +146,47 @@ class Weight(SQLModel, table=True):
 
 
 class Checkpoint(SQLModel, table=True):
+    __table_args__ = (Index("ix_checkpoint_user_created", "user_id", "created_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
+# ──────────────── дневные итоги (rollup) ────────────────
+class DailyTotals(SQLModel, table=True):
+    """Суммы за МСК-сутки; обновляются в той же транзакции, что и вставки."""
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    day: date = Field(primary_key=True)       # дата по Москве
+    kcal_in: int = 0                          # сумма Meal.calories
+    kcal_out: int = 0                         # сумма Workout.calories (<=0)
+    workouts_cnt: int = 0
+    last_weight: Optional[float] = None       # последнее взвешивание за день
+
+
+# ──────────────── кэш ответов GPT ────────────────
+class GptCache(SQLModel, table=True):
+    key: str = Field(primary_key=True)        # sha1(вид|модель|промпт|текст)
+    kind: str                                 # meal / workout
+    value: str                                # JSON-ответ модели
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+# ──────────────── архив raw_text (services/maintenance.py) ────────────────
+class RawTextArchive(SQLModel, table=True):
+    """Пачка старых raw_text одной таблицы: zlib(JSON {id: текст})."""
+
+    __table_args__ = (Index("ix_rawtextarchive_kind_last", "kind", "last_id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str                                # meal | workout
+    first_id: int
+    last_id: int
+    rows: int
+    payload: bytes
+    archived_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 # ──────────────── NEW: друзья ────────────────
 class FriendRequest(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -75,6 +197,10 @@ class FriendRequest(SQLModel, table=True):
 
 
 class Friend(SQLModel, table=True):
+    __table_args__ = (
+        Index("ux_friend_user_friend", "user_id", "friend_id", unique=True),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     friend_id: int = Field(foreign_key="user.id")
@@ -82,16 +208,41 @@ class Friend(SQLModel, table=True):
 
 # ────────────────── init + helper ───────────────────
 def init_db() -> None:
-    """Создаёт таблицы, если их ещё нет."""
+    """Создаёт таблицы, если их ещё нет, докатывает миграции и ставит режим журнала."""
+    with engine.connect() as conn:
+        # на новой (пустой) БД — сразу; на существующей вступит в силу после
+        # `python -m services.maintenance --vacuum` (полный VACUUM)
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        # режим хранится в файле БД; из WAL в DELETE — только без других соединений
+        conn.exec_driver_sql(f"PRAGMA journal_mode={'WAL' if WAL else 'DELETE'}")
     SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
 
 
 @contextmanager
 def get_session() -> Session:
-    """Контекстный менеджер для работы с БД."""
+    """Синхронная сессия — только для скриптов и кода вне event-loop."""
     with Session(engine) as session:
         yield session
 
 
+@asynccontextmanager
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    """Асинхронная сессия для хендлеров и планировщика (чтение и запись).
+
+    В профиле wal соединение у процесса одно: не держать сессию через
+    сетевые вызовы и не открывать вторую внутри первой.
+    """
+    async with async_session_factory() as session:
+        yield session
+
+
+@asynccontextmanager
+async def get_read_session() -> AsyncIterator[AsyncSession]:
+    """Сессия только для чтения (пул читающих соединений в профиле wal)."""
+    async with read_session_factory() as session:
+        yield session
+
+
 # при первом импорте создаём таблицы
 init_db()
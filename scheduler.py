@@ -1,46 +1,143 @@
-# scheduler.py — фикc: извлекаем chat_id корректно
+# scheduler.py — поминутные напоминания по часовым поясам пользователей
+#
+# Каждую минуту отправляем утреннее / вечернее сообщение только тем, у кого
+# User.morning_utc_min / evening_utc_min совпадает с минутой тика UTC
+# (выборка по индексу). Тик забирает все ещё не разосланные минуты до
+# текущей: опоздавший тик не отправит следующую корзину дважды и не
+# пропустит свою. Раз в час корзины пересчитываются, чтобы учесть
+# переход на летнее/зимнее время. Ночью — обслуживание БД
+# (services/maintenance.py).
+
+import asyncio
+from datetime import datetime, timedelta
 
 from aiogram import Bot
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import update
 from sqlmodel import select
 from zoneinfo import ZoneInfo
 
-from models_and_db import get_session, User
+from config import settings
+from models_and_db import get_async_session, get_read_session, User
 from handlers.menu import menu_button
+from services.broadcast import broadcast, iter_chat_ids
+from services.maintenance import run_maintenance
+from utils.time import utc_minute_of_day
 
 MSK = ZoneInfo("Europe/Moscow")
+CATCHUP = timedelta(minutes=2)    # сколько пропущенных минут тик ещё досылает
+
+_sent_through: datetime | None = None   # последняя минута UTC, взятая в рассылку
+
+MORNING_TEXT = (
+    "Доброе утро!\nУдачных тренировок сегодня 💪\n"
+    "Не забудь добавить результаты утреннего взвешивания 👇"
+)
+EVENING_TEXT = (
+    "Пора готовиться ко сну!\nСтабильный сон – залог прогресса 😴\n"
+    "Не забудь добавить результаты вечернего взвешивания 👇"
+)
+
+
+async def morning(bot: Bot, minute: int):
+    await broadcast(
+        bot,
+        MORNING_TEXT,
+        name=f"morning@{minute}",
+        reply_markup=menu_button(),
+        chat_ids=iter_chat_ids(User.morning_utc_min == minute),
+    )
+
+
+async def evening(bot: Bot, minute: int):
+    await broadcast(
+        bot,
+        EVENING_TEXT,
+        name=f"evening@{minute}",
+        reply_markup=menu_button(),
+        chat_ids=iter_chat_ids(User.evening_utc_min == minute),
+    )
+
+
+def _due_minutes(now: datetime) -> list[datetime]:
+    """Минуты UTC, которые этот тик забирает себе (без await — тики не делят минуту)."""
+    global _sent_through
+    current = now.replace(second=0, microsecond=0)
+    first = current if _sent_through is None else _sent_through + timedelta(minutes=1)
+    first = max(first, current - CATCHUP)
+    due = []
+    while first <= current:
+        due.append(first)
+        first += timedelta(minutes=1)
+    if due:
+        _sent_through = due[-1]
+    return due
+
 
+async def reminders(bot: Bot):
+    """Поминутный тик: рассылка по корзинам ещё не отработанных минут UTC."""
+    for at in _due_minutes(datetime.utcnow()):
+        minute = at.hour * 60 + at.minute
+        await asyncio.gather(morning(bot, minute), evening(bot, minute))
 
-def _chat_ids() -> list[int]:
-    """Возвращает список chat_id всех зарегистрированных пользователей."""
-    with get_session() as s:
-        # select(User.chat_id) → каждая строка = tuple(int) либо int (зависит от версии)
-        return [row[0] if isinstance(row, tuple) else int(row) for row in s.exec(select(User.chat_id)).all()]
 
+async def refresh_buckets():
+    """Пересчитывает UTC-корзины там, где они разошлись с поясом (переход часов).
 
-async def morning(bot: Bot):
-    for cid in _chat_ids():
-        await bot.send_message(
-            cid,
-            "Доброе утро!\nУдачных тренировок сегодня 💪\n"
-            "Не забудь добавить результаты утреннего взвешивания 👇",
-            reply_markup=menu_button(),
-        )
+    Уникальные сочетания читаются на читающем соединении; UPDATE — только
+    для тех, чья корзина изменилась, и только строк со старым значением.
+    """
+    async with get_read_session() as s:
+        combos = (
+            await s.exec(
+                select(
+                    User.tz, User.morning_min, User.evening_min,
+                    User.morning_utc_min, User.evening_utc_min,
+                ).distinct()
+            )
+        ).all()
 
+    changed = {}
+    for tz, morning_min, evening_min, morning_utc, evening_utc in combos:
+        new = (utc_minute_of_day(tz, morning_min), utc_minute_of_day(tz, evening_min))
+        if new != (morning_utc, evening_utc):
+            changed[(tz, morning_min, evening_min)] = new
+    if not changed:
+        return
 
-async def evening(bot: Bot):
-    for cid in _chat_ids():
-        await bot.send_message(
-            cid,
-            "Пора готовиться ко сну!\nСтабильный сон – залог прогресса 😴\n"
-            "Не забудь добавить результаты вечернего взвешивания 👇",
-            reply_markup=menu_button(),
-        )
+    async with get_async_session() as s:
+        for (tz, morning_min, evening_min), (morning_utc, evening_utc) in changed.items():
+            await s.exec(
+                update(User)
+                .where(
+                    (User.tz == tz)
+                    & (User.morning_min == morning_min)
+                    & (User.evening_min == evening_min)
+                    & ((User.morning_utc_min != morning_utc) | (User.evening_utc_min != evening_utc))
+                )
+                .values(morning_utc_min=morning_utc, evening_utc_min=evening_utc)
+            )
+        await s.commit()
 
 
 def make_scheduler(bot: Bot, loop) -> AsyncIOScheduler:
     sched = AsyncIOScheduler(timezone=MSK, event_loop=loop)
-    sched.add_job(morning, CronTrigger(hour=6, minute=0), args=[bot], id="morning")
-    sched.add_job(evening, CronTrigger(hour=22, minute=00), args=[bot], id="evening")
+    # тик может пересечься с долгой рассылкой прошлой минуты — лимитер общий
+    sched.add_job(
+        reminders,
+        CronTrigger(minute="*"),
+        args=[bot],
+        id="reminders",
+        max_instances=10,
+        misfire_grace_time=30,
+    )
+    sched.add_job(refresh_buckets, CronTrigger(minute=30), id="refresh_buckets")
+    sched.add_job(
+        run_maintenance,
+        CronTrigger(hour=settings.MAINT_HOUR, minute=settings.MAINT_MINUTE),
+        id="maintenance",
+        max_instances=1,
+        coalesce=True,
+    )
     return sched
@@ -0,0 +1,195 @@
+"""services/broadcast.py — массовая рассылка с ограничением скорости
+
+chat_id читаются из БД порциями (keyset по User.id), отправка идёт
+пулом воркеров под общим на процесс лимитером ≈ BROADCAST_RATE
+сообщений/сек — одновременные рассылки делят один бюджет.
+TelegramRetryAfter ставит на паузу всю рассылку и повторяет сообщение,
+заблокировавшие бота пользователи помечаются User.is_blocked и больше
+не попадают в выборку (и сбрасываются из кэша пользователей). Любая
+другая ошибка отправки считается failed для этого получателя.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+from aiogram.types import InlineKeyboardMarkup
+from sqlalchemy import ColumnElement, update
+from sqlmodel import select
+
+from config import settings
+from middlewares.user import user_cache
+from models_and_db import get_async_session, get_read_session, User
+from services.metrics import BROADCAST_MESSAGES, BROADCAST_SECONDS
+
+log = logging.getLogger(__name__)
+
+MAX_RETRIES = 3
+
+
+# ─────────────────────── отчёт ───────────────────────
+@dataclass(slots=True)
+class BroadcastReport:
+    name: str
+    sent: int = 0
+    blocked: int = 0
+    failed: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+    blocked_ids: list[int] = field(default_factory=list, repr=False)
+
+    @property
+    def rate(self) -> float:
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"broadcast {self.name}: sent={self.sent} blocked={self.blocked} "
+            f"failed={self.failed} retries={self.retries} "
+            f"in {self.elapsed:.1f}s ({self.rate:.1f} msg/s)"
+        )
+
+
+# ─────────────────────── лимитер ───────────────────────
+class RateLimiter:
+    """Равномерно раздаёт слоты: не чаще `rate` вызовов в секунду."""
+
+    def __init__(self, rate: float):
+        self._interval = 1 / rate
+        self._next = 0.0
+
+    async def acquire(self) -> None:
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, seconds: float) -> None:
+        """Сдвигает все следующие слоты (RetryAfter действует на весь бот)."""
+        self._next = max(self._next, time.monotonic() + seconds)
+
+
+limiter = RateLimiter(settings.BROADCAST_RATE)
+
+
+# ─────────────────────── источник ───────────────────────
+async def iter_chat_ids(
+    *where: ColumnElement[bool], chunk: int = settings.BROADCAST_CHUNK
+) -> AsyncIterator[int]:
+    """chat_id активных пользователей порциями по `chunk` (keyset по id).
+
+    `where` — дополнительные условия, например корзина напоминаний.
+    """
+    last_id = 0
+    while True:
+        async with get_read_session() as s:
+            rows = (
+                await s.exec(
+                    select(User.id, User.chat_id)
+                    .where(
+                        (User.id > last_id) & (User.is_blocked == False),  # noqa: E712
+                        *where,
+                    )
+                    .order_by(User.id)
+                    .limit(chunk)
+                )
+            ).all()
+        for _, chat_id in rows:
+            yield chat_id
+        if len(rows) < chunk:
+            return
+        last_id = rows[-1][0]
+
+
+async def _mark_blocked(chat_ids: list[int]) -> None:
+    for i in range(0, len(chat_ids), 500):
+        async with get_async_session() as s:
+            await s.exec(
+                update(User)
+                .where(User.chat_id.in_(chat_ids[i : i + 500]))
+                .values(is_blocked=True)
+            )
+            await s.commit()
+    for chat_id in chat_ids:
+        user_cache.invalidate(chat_id)           # иначе кэш ещё TTL считает его активным
+
+
+# ─────────────────────── рассылка ───────────────────────
+async def broadcast(
+    bot: Bot,
+    text: str,
+    *,
+    name: str = "broadcast",
+    reply_markup: InlineKeyboardMarkup | None = None,
+    chat_ids: AsyncIterator[int] | None = None,
+    concurrency: int = settings.BROADCAST_CONCURRENCY,
+) -> BroadcastReport:
+    """Отправляет `text` всем chat_ids (по умолчанию — всем пользователям)."""
+    report = BroadcastReport(name)
+    queue: asyncio.Queue[int | None] = asyncio.Queue(maxsize=concurrency * 4)
+    started = time.monotonic()
+
+    async def send(chat_id: int) -> None:
+        for _ in range(MAX_RETRIES):
+            await limiter.acquire()
+            try:
+                await bot.send_message(chat_id, text, reply_markup=reply_markup)
+                report.sent += 1
+                return
+            except TelegramRetryAfter as e:
+                report.retries += 1
+                limiter.pause(e.retry_after)
+            except TelegramForbiddenError:
+                report.blocked += 1
+                report.blocked_ids.append(chat_id)
+                return
+            except TelegramAPIError as e:
+                log.debug("broadcast %s → %s failed: %s", name, chat_id, e)
+                break
+            except Exception:
+                # сеть, сериализация и т.п.: один получатель не рвёт всю рассылку
+                log.exception("broadcast %s → %s crashed", name, chat_id)
+                break
+        report.failed += 1
+
+    async def worker() -> None:
+        while (chat_id := await queue.get()) is not None:
+            await send(chat_id)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        async for chat_id in chat_ids or iter_chat_ids():
+            await queue.put(chat_id)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for w in workers:
+            w.cancel()
+
+    if report.blocked_ids:
+        await _mark_blocked(report.blocked_ids)
+
+    report.elapsed = time.monotonic() - started
+    log.info("%s", report)
+    _observe(report)
+    return report
+
+
+def _observe(report: BroadcastReport) -> None:
+    job = report.name.split("@")[0]              # morning@480 → morning: без минуты в метках
+    for result in ("sent", "blocked", "failed", "retries"):
+        if count := getattr(report, result):
+            BROADCAST_MESSAGES.inc(count, job=job, result=result)
+    BROADCAST_SECONDS.observe(report.elapsed, job=job)
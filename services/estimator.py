@@ -0,0 +1,167 @@
+"""services/estimator.py — локальная оценка тренировок и еды без GPT
+
+Тренировки: таблица MET (Compendium of Physical Activities, округлено),
+ккал = MET × вес пользователя × часы. Еда: калорийность на 100 г и
+типичный вес штуки/порции.
+
+В строгом режиме оценка возвращается только если текст разобран
+однозначно (одна активность + длительность; у каждой позиции еды
+известен продукт и количество) — иначе None и хендлер идёт в GPT.
+С guess=True недостающее добивается значениями по умолчанию — это
+запасной вариант, когда GPT недоступен.
+"""
+
+from __future__ import annotations
+
+import re
+
+from services.gpt_cache import normalize
+
+# (шаблон, тип, MET)
+ACTIVITIES: list[tuple[str, str, float]] = [
+    (r"бег|пробеж|бежал|run", "бег", 9.8),
+    (r"ходьб|шаг|walk", "ходьба", 3.5),
+    (r"прогулк|гулял", "прогулка", 3.0),
+    (r"вело|bike|cycl", "велосипед", 7.5),
+    (r"сайкл|велотренаж", "велотренажёр", 6.8),
+    (r"плава|бассейн|swim", "плавание", 7.0),
+    (r"бокс|box", "бокс", 9.0),
+    (r"единобор|борьб|самбо|дзюдо|карате|mma", "единоборства", 10.0),
+    (r"йог|yoga", "йога", 2.5),
+    (r"пилатес|pilates", "пилатес", 3.0),
+    (r"растяжк|стретч|stretch", "растяжка", 2.3),
+    (r"силов|тренаж|качал|\bзал|штанг|gym", "силовая", 5.0),
+    (r"кроссфит|crossfit", "кроссфит", 8.0),
+    (r"функциональ|hiit|интервал", "функциональная", 8.0),
+    (r"футбол|football|soccer", "футбол", 7.0),
+    (r"баскетбол|basketball", "баскетбол", 6.5),
+    (r"волейбол|volleyball", "волейбол", 4.0),
+    (r"теннис|tennis", "теннис", 7.3),
+    (r"хоккей|hockey", "хоккей", 8.0),
+    (r"танц|dance|зумба", "танцы", 5.0),
+    (r"скакалк", "скакалка", 11.0),
+    (r"лыж|ski", "лыжи", 7.0),
+    (r"коньк", "коньки", 7.0),
+    (r"гребл|row", "гребля", 7.0),
+    (r"эллипс", "эллипс", 5.0),
+]
+
+# (шаблон, название, ккал на 100 г, вес штуки г, типичная порция г)
+FOODS: list[tuple[str, str, int, int | None, int]] = [
+    (r"овсян|геркулес", "овсянка", 88, None, 250),
+    (r"гречк|гречнев", "гречка", 110, None, 200),
+    (r"рис", "рис", 130, None, 200),
+    (r"макарон|паст|спагетти", "макароны", 150, None, 250),
+    (r"картоф|картош|пюре", "картофель", 85, 120, 250),
+    (r"куриц|курин|грудк", "курица", 165, None, 150),
+    (r"индейк", "индейка", 150, None, 150),
+    (r"говяд|стейк", "говядина", 250, None, 150),
+    (r"свинин", "свинина", 260, None, 150),
+    (r"котлет", "котлета", 220, 80, 160),
+    (r"лосос|семг|форел", "лосось", 200, None, 150),
+    (r"рыб|треск|минтай", "рыба", 110, None, 150),
+    (r"яйц|яичниц|омлет", "яйца", 155, 55, 110),
+    (r"творог", "творог", 120, None, 200),
+    (r"сыр", "сыр", 350, None, 40),
+    (r"йогурт", "йогурт", 70, 125, 150),
+    (r"кефир", "кефир", 50, None, 250),
+    (r"молок", "молоко", 60, None, 250),
+    (r"банан", "банан", 90, 120, 120),
+    (r"яблок", "яблоко", 52, 180, 180),
+    (r"апельсин|мандарин", "цитрусы", 45, 150, 150),
+    (r"хлеб|батон|тост", "хлеб", 250, 30, 60),
+    (r"салат|овощ|огур|помидор|томат", "овощи", 25, None, 200),
+    (r"суп|щи|бульон", "суп", 45, None, 300),
+    (r"борщ", "борщ", 50, None, 300),
+    (r"пельмен|варени", "пельмени", 250, 12, 250),
+    (r"пицц", "пицца", 270, 120, 240),
+    (r"шоколад", "шоколад", 540, None, 25),
+    (r"орех|миндал|фундук|кешью", "орехи", 600, None, 30),
+    (r"протеин|протеинов", "протеиновый коктейль", 120, None, 300),
+    (r"сок", "сок", 45, None, 250),
+]
+
+ACTIVITY_RE = [(re.compile(rf"\b(?:{p})", re.I), name, met) for p, name, met in ACTIVITIES]
+FOOD_RE = [(re.compile(rf"\b(?:{p})", re.I), *rest) for p, *rest in FOODS]
+
+DURATION_RE = re.compile(r"(\d+(?:\.\d+)?) (мин|ч)\b")
+# для guess: «45м» — минуты, как в регулярке хендлера (в точной оценке «м» — метры)
+GUESS_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?) ?(мин|м|ч)\b")
+QTY_RE = re.compile(r"(\d+(?:\.\d+)?) (кг|г|л|мл|шт)\b")
+COUNT_RE = re.compile(r"\b(\d+)\b")            # «2 яйца» — штуки без единицы
+SPLIT_RE = re.compile(r"\s*(?:[,;+\n]|\bи\b)\s*")
+
+GUESS_MET = 5.0        # «какая-то тренировка»
+GUESS_MIN = 60
+
+
+# ─────────────────────── тренировки ───────────────────────
+def _duration_min(text: str, pattern: re.Pattern = DURATION_RE) -> int | None:
+    total = 0.0
+    for value, unit in pattern.findall(text):
+        total += float(value) * (60 if unit == "ч" else 1)
+    return round(total) or None
+
+
+def estimate_workout(text: str, weight_kg: float, *, guess: bool = False) -> dict | None:
+    """{type, duration_min, calories} по MET-таблице либо None.
+
+    guess=True — оценка всегда; если длительность не распознана, в ответе
+    нет duration_min (калории — на GUESS_MIN минут).
+    """
+    norm = normalize(text)
+    found = [(name, met) for rx, name, met in ACTIVITY_RE if rx.search(norm)]
+    duration = _duration_min(norm)
+
+    if len(found) != 1 or duration is None:
+        if not guess:
+            return None
+        words = text.split()
+        found = found[:1] or [(words[0].lower() if words else "тренировка", GUESS_MET)]
+        duration = duration or _duration_min(norm, GUESS_DURATION_RE)
+
+    name, met = found[0]
+    result = {"type": name, "calories": round(met * weight_kg * (duration or GUESS_MIN) / 60)}
+    if duration:                                # нет длительности — решает хендлер
+        result["duration_min"] = duration
+    return result
+
+
+# ─────────────────────── еда ───────────────────────
+def _grams(value: float, unit: str, piece_g: int | None) -> float | None:
+    if unit in ("г", "мл"):
+        return value
+    if unit in ("кг", "л"):
+        return value * 1000
+    return value * piece_g if piece_g else None          # шт
+
+
+def estimate_meal(text: str, *, guess: bool = False) -> dict | None:
+    """{food, calories} по таблице калорийности либо None."""
+    items: list[str] = []
+    calories = 0.0
+    for part in filter(None, SPLIT_RE.split(text)):
+        norm = normalize(part)
+        foods = [f for f in FOOD_RE if f[0].search(norm)]
+        qty = QTY_RE.findall(norm)
+        if not qty and len(count := COUNT_RE.findall(norm)) == 1:
+            qty = [(count[0], "шт")]
+
+        if len(foods) == 1 and len(qty) == 1:
+            _, name, kcal100, piece_g, _ = foods[0]
+            grams = _grams(float(qty[0][0]), qty[0][1], piece_g)
+            if grams is not None:
+                items.append(f"{name} {qty[0][0]} {qty[0][1]}")
+                calories += kcal100 * grams / 100
+                continue
+
+        if not guess or not foods:
+            return None
+        # guess: берём первый найденный продукт и типичную порцию
+        _, name, kcal100, _, portion_g = foods[0]
+        items.append(name)
+        calories += kcal100 * portion_g / 100
+
+    if not items:
+        return None
+    return {"food": ", ".join(items).capitalize(), "calories": round(calories)}
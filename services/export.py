@@ -0,0 +1,86 @@
+"""services/export.py — выгрузка всей истории пользователя в gzip-файл
+
+Meal, Workout, Weight и Checkpoint читаются по очереди синхронным
+движком с yield_per=EXPORT_FETCH (курсор отдаёт строки порциями по
+индексу (user_id, created_at), без сортировки) и сразу пишутся в
+gzip-поток временного файла. В памяти — одна порция строк, сколько бы
+записей ни было у пользователя. Функция блокирующая: хендлер зовёт её
+через asyncio.to_thread.
+
+Форматы — одна таблица на все виды записей:
+    csv    kind,id,created_at,description,calories,duration_min,weight_kg,bmi
+    ndjson {"kind": "meal", "id": …, "created_at": "…", …} на строку
+"""
+
+from __future__ import annotations
+
+import csv
+import gzip
+import json
+import tempfile
+from pathlib import Path
+from typing import Any, Iterator
+
+from sqlalchemy import literal, null
+from sqlmodel import select
+
+from config import settings
+from models_and_db import engine, Checkpoint, Meal, Weight, Workout
+
+FORMATS = ("csv", "ndjson")
+COLUMNS = ("kind", "id", "created_at", "description", "calories", "duration_min", "weight_kg", "bmi")
+
+
+def _queries(user_id: int):
+    """(вид, запрос) в колонках COLUMNS — порядок по индексу (user_id, created_at)."""
+    yield "meal", select(
+        Meal.id, Meal.created_at, Meal.description, Meal.calories, null(), null(), null()
+    ).where(Meal.user_id == user_id).order_by(Meal.created_at)
+    yield "workout", select(
+        Workout.id, Workout.created_at, Workout.type, Workout.calories,
+        Workout.duration_min, null(), null(),
+    ).where(Workout.user_id == user_id).order_by(Workout.created_at)
+    yield "weight", select(
+        Weight.id, Weight.created_at, null(), null(), null(), Weight.weight_kg, Weight.bmi
+    ).where(Weight.user_id == user_id).order_by(Weight.created_at)
+    yield "checkpoint", select(
+        Checkpoint.id, Checkpoint.created_at, literal("checkpoint"), null(), null(), null(), null()
+    ).where(Checkpoint.user_id == user_id).order_by(Checkpoint.created_at)
+
+
+def iter_rows(user_id: int) -> Iterator[tuple[Any, ...]]:
+    """Все записи пользователя кортежами в порядке COLUMNS."""
+    with engine.connect() as conn:
+        for kind, stmt in _queries(user_id):
+            result = conn.execution_options(yield_per=settings.EXPORT_FETCH).execute(stmt)
+            for partition in result.partitions():
+                for row in partition:
+                    yield (kind, *row)
+
+
+def write_export(user_id: int, fmt: str) -> tuple[Path, int]:
+    """Пишет выгрузку во временный .gz-файл; возвращает путь и число строк.
+
+    Готовый файл удаляет вызывающий; недописанный при ошибке удаляется здесь.
+    """
+    tmp = tempfile.NamedTemporaryFile(prefix="export_", suffix=f".{fmt}.gz", delete=False)
+    path = Path(tmp.name)
+    rows = 0
+    try:
+        with tmp, gzip.open(tmp, "wt", encoding="utf-8", newline="") as out:
+            if fmt == "csv":
+                writer = csv.writer(out)
+                writer.writerow(COLUMNS)
+                for row in iter_rows(user_id):
+                    writer.writerow(row)
+                    rows += 1
+            else:
+                for row in iter_rows(user_id):
+                    record = dict(zip(COLUMNS, row))
+                    record["created_at"] = record["created_at"].isoformat()
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    rows += 1
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return path, rows
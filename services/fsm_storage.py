@@ -0,0 +1,223 @@
+"""services/fsm_storage.py — FSM-хранилище aiogram поверх SQLite (WAL)
+
+Состояния и данные FSM (регистрация, подтверждение еды, поиск друга)
+переживают рестарт и не копятся в памяти бесконечно:
+
+* запись отложенная: set_state/set_data/update_data одного хендлера
+  меняют только кэш, раз в FSM_FLUSH_INTERVAL секунд грязные ключи
+  уходят в БД одной транзакцией (несколько правок ключа — одна строка);
+* пустое состояние (state.clear()) — это DELETE, а не строка-пустышка;
+* состояния старше FSM_TTL считаются брошенными: не читаются и
+  периодически удаляются;
+* кэш в памяти ограничен FSM_CACHE_SIZE (вытесняются только чистые).
+
+Кэш авторитетен для своего процесса, поэтому несколько процессов могут
+делить один файл, только если чат всегда попадает в один и тот же
+процесс (шардинг по chat_id).
+
+Выбор хранилища — settings.FSM_STORAGE: sqlite | redis | memory.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+import aiosqlite
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from config import settings
+
+log = logging.getLogger(__name__)
+
+FSM_DB = Path(__file__).resolve().parent.parent / settings.FSM_DB_PATH
+PURGE_EVERY = 600        # секунд между чистками просроченных строк
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    key        TEXT PRIMARY KEY,
+    state      TEXT,
+    data       TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_fsm_updated_at ON fsm (updated_at);
+"""
+
+# (state, data, updated_at)
+Entry = tuple[str | None, dict[str, Any], float]
+
+
+def _key(key: StorageKey) -> str:
+    return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+
+class SQLiteStorage(BaseStorage):
+    def __init__(
+        self,
+        path: Path | str = FSM_DB,
+        *,
+        ttl: int = settings.FSM_TTL,
+        flush_interval: float = settings.FSM_FLUSH_INTERVAL,
+        cache_size: int = settings.FSM_CACHE_SIZE,
+    ):
+        self.path = str(path)
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.cache_size = cache_size
+        self._cache: OrderedDict[str, Entry] = OrderedDict()
+        self._dirty: set[str] = set()
+        self._db: aiosqlite.Connection | None = None
+        self._open_lock = asyncio.Lock()
+        self._flusher: asyncio.Task | None = None
+        self._purged_at = 0.0
+
+    # ─────────────────────── соединение ───────────────────────
+    async def _conn(self) -> aiosqlite.Connection:
+        if self._db is None:
+            async with self._open_lock:
+                if self._db is None:
+                    db = await aiosqlite.connect(self.path)
+                    await db.execute("PRAGMA journal_mode=WAL")
+                    await db.execute("PRAGMA synchronous=NORMAL")
+                    await db.execute("PRAGMA busy_timeout=5000")
+                    await db.executescript(SCHEMA)
+                    await db.commit()
+                    self._db = db
+        return self._db
+
+    # ─────────────────────── кэш ───────────────────────
+    async def _entry(self, key: StorageKey) -> Entry:
+        k = _key(key)
+        now = time.time()
+        entry = self._cache.get(k)
+        if entry is None:
+            db = await self._conn()
+            async with db.execute(
+                "SELECT state, data, updated_at FROM fsm WHERE key = ?", (k,)
+            ) as cur:
+                row = await cur.fetchone()
+            entry = (row[0], json.loads(row[1]), row[2]) if row else (None, {}, now)
+            self._remember(k, entry)
+        else:
+            self._cache.move_to_end(k)
+
+        if now - entry[2] > self.ttl:
+            return None, {}, now
+        return entry
+
+    def _remember(self, k: str, entry: Entry) -> None:
+        self._cache[k] = entry
+        self._cache.move_to_end(k)
+        if len(self._cache) <= self.cache_size:
+            return
+        for old in list(self._cache):
+            if len(self._cache) <= self.cache_size:
+                break
+            if old not in self._dirty:
+                del self._cache[old]
+
+    async def _write(self, key: StorageKey, state: str | None, data: dict[str, Any]) -> None:
+        k = _key(key)
+        self._dirty.add(k)                      # до _remember: грязные не вытесняются
+        self._remember(k, (state, data, time.time()))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_later())
+
+    # ─────────────────────── запись в БД ───────────────────────
+    async def _flush_later(self) -> None:
+        # ключи, записанные во время сброса (или вернувшиеся после ошибки),
+        # уходят следующим кругом: _write не заводит второй флашер, пока жив этот
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("FSM flush failed")
+            if not self._dirty:
+                return
+
+    async def flush(self) -> None:
+        """Сбрасывает накопленные правки одной транзакцией."""
+        if not self._dirty:
+            return
+        keys, self._dirty = self._dirty, set()
+        upserts, deletes = [], []
+        for k in keys:
+            entry = self._cache.get(k)
+            if entry is None:
+                continue
+            state, data, ts = entry
+            if state is None and not data:
+                deletes.append((k,))
+            else:
+                upserts.append((k, state, json.dumps(data, ensure_ascii=False), ts))
+
+        db = await self._conn()
+        try:
+            if upserts:
+                await db.executemany(
+                    "INSERT INTO fsm (key, state, data, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET state = excluded.state, "
+                    "data = excluded.data, updated_at = excluded.updated_at",
+                    upserts,
+                )
+            if deletes:
+                await db.executemany("DELETE FROM fsm WHERE key = ?", deletes)
+
+            now = time.time()
+            if now - self._purged_at > PURGE_EVERY:
+                self._purged_at = now
+                await db.execute("DELETE FROM fsm WHERE updated_at < ?", (now - self.ttl,))
+            await db.commit()
+        except BaseException:
+            self._dirty |= keys                 # повторим при следующем сбросе
+            raise
+
+    # ─────────────────────── BaseStorage ───────────────────────
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        _, data, _ = await self._entry(key)
+        value = state.state if isinstance(state, State) else state
+        await self._write(key, value, data)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._entry(key))[0]
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        state, _, _ = await self._entry(key)
+        await self._write(key, state, dict(data))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return dict((await self._entry(key))[1])
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+        await self.flush()
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+
+def make_storage() -> BaseStorage:
+    """Хранилище FSM согласно settings.FSM_STORAGE."""
+    kind = settings.FSM_STORAGE
+    if kind == "sqlite":
+        return SQLiteStorage()
+    if kind == "redis":
+        # нужен пакет redis; TTL — та же политика брошенных состояний
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        return RedisStorage.from_url(
+            settings.FSM_REDIS_URL, state_ttl=settings.FSM_TTL, data_ttl=settings.FSM_TTL
+        )
+    if kind == "memory":
+        return MemoryStorage()
+    raise ValueError(f"FSM_STORAGE: неизвестное хранилище {kind!r}")
@@ -0,0 +1,124 @@
+"""services/gpt_batcher.py — микро-батчинг однотипных GPT-оценок
+
+Запросы, пришедшие в течение окна GPT_BATCH_WINDOW_MS (или пока не
+набралось GPT_BATCH_MAX), уходят одной JSON-подсказкой вида
+{"items": [...]} → {"results": [...]}. Каждый ожидающий хендлер
+получает свой элемент. Если пакетный ответ не удался или не совпал по
+длине — элементы переотправляются поодиночке.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+
+from config import settings
+from services.gpt_client import GPTError, chat_json
+
+log = logging.getLogger(__name__)
+
+BATCH_SUFFIX = (
+    "\n\nНа вход приходит JSON {\"items\": [строки]}. Для каждой строки "
+    "верни объект описанного формата, в том же порядке: "
+    "{\"results\": [объекты]}."
+)
+
+
+class Batcher:
+    """Собирает одиночные запросы с одним системным промптом в пакеты."""
+
+    def __init__(
+        self,
+        system: str,
+        *,
+        op: str = "other",
+        temperature: float = 0.2,
+        window_ms: int = settings.GPT_BATCH_WINDOW_MS,
+        max_items: int = settings.GPT_BATCH_MAX,
+    ):
+        self.system = system
+        self.op = op                    # метка в метриках GPT; пакет — "{op}_batch"
+        self.temperature = temperature
+        self.window = window_ms / 1000
+        self.max_items = max_items
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, text: str) -> dict:
+        """Оценка одного текста; бросает GPTError, как и chat_json."""
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((text, fut))
+        if len(self._pending) >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _single(self, text: str) -> dict:
+        return await chat_json(
+            text, system=self.system, temperature=self.temperature, op=self.op
+        )
+
+    async def _run(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        try:
+            await self._resolve(batch)
+        except BaseException as e:
+            # что бы ни случилось, ни один хендлер не должен ждать вечно
+            for _, fut in batch:
+                if not fut.done():
+                    if isinstance(e, asyncio.CancelledError):
+                        fut.cancel()
+                    else:
+                        fut.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            log.exception("GPT batch of %s crashed", len(batch))
+
+    async def _resolve(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        texts = [text for text, _ in batch]
+        results: list | None = None
+        if len(batch) > 1:
+            try:
+                data = await chat_json(
+                    json.dumps({"items": texts}, ensure_ascii=False),
+                    system=self.system + BATCH_SUFFIX,
+                    temperature=self.temperature,
+                    op=f"{self.op}_batch",
+                )
+                results = data.get("results") if isinstance(data, dict) else None
+            except GPTError as e:
+                log.info("GPT batch of %s failed (%s), falling back", len(batch), e.kind)
+
+        if (
+            isinstance(results, list)
+            and len(results) == len(batch)
+            and all(isinstance(r, dict) for r in results)
+        ):
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+            return
+
+        # поодиночке: ошибки каждого запроса достаются своему хендлеру
+        singles = await asyncio.gather(
+            *(self._single(text) for text in texts), return_exceptions=True
+        )
+        for (_, fut), result in zip(batch, singles):
+            if fut.done():
+                continue
+            if isinstance(result, BaseException):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
@@ -0,0 +1,124 @@
+"""services/gpt_cache.py — кэш GPT-оценок еды и тренировок
+
+Ключ — sha1 от (вид запроса, модель, текст промпта, нормализованный
+ввод), поэтому смена модели или промпта сама «сбрасывает» кэш.
+Два уровня: LRU в памяти процесса и таблица GptCache в SQLite с TTL и
+ограничением числа строк (старые записи вычищаются при записи).
+Попадания по уровням и промахи — метрика bot_gpt_cache_lookups_total.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import select
+
+from config import settings
+from models_and_db import get_async_session, get_read_session, GptCache
+from services.metrics import GPT_CACHE_LOOKUPS
+
+PRUNE_EVERY = 200          # чистим SQLite-уровень раз в N записей
+
+_UNITS = [
+    (re.compile(r"\b(?:грамм(?:ов|а)?|гр)\b"), "г"),
+    (re.compile(r"\b(?:килограмм(?:ов|а)?)\b"), "кг"),
+    (re.compile(r"\b(?:миллилитр(?:ов|а)?)\b"), "мл"),
+    (re.compile(r"\b(?:минут[аы]?|min(?:utes?)?)\b"), "мин"),
+    (re.compile(r"\b(?:час(?:а|ов)?|h(?:ours?)?)\b"), "ч"),
+    (re.compile(r"\b(?:калори[йия]|кал|kcal|cal)\b"), "ккал"),
+    (re.compile(r"\b(?:штук[аи]?|шт)\b"), "шт"),
+]
+_PUNCT = re.compile(r"[^\w\s]+")
+_NUM_UNIT = re.compile(r"(\d)([^\W\d_])")   # «300г» → «300 г»
+_SPACES = re.compile(r"\s+")
+
+_lru: OrderedDict[str, dict] = OrderedDict()
+_writes = 0
+
+
+# ─────────────────────── ключ ───────────────────────
+def normalize(text: str) -> str:
+    """«Овсянка, 300гр.» и «овсянка 300 г» дают одну строку."""
+    s = text.lower().replace("ё", "е").replace(",", ".")
+    s = _PUNCT.sub(lambda m: "." if m.group() == "." else " ", s)
+    s = re.sub(r"(?<!\d)\.|\.(?!\d)", " ", s)   # точка остаётся только в 1.5
+    s = _NUM_UNIT.sub(r"\1 \2", s)
+    for pattern, unit in _UNITS:
+        s = pattern.sub(unit, s)
+    return _SPACES.sub(" ", s).strip()
+
+
+def cache_key(kind: str, text: str, prompt: str) -> str:
+    raw = "\x1f".join((kind, settings.GPT_MODEL, prompt, normalize(text)))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+# ─────────────────────── чтение / запись ───────────────────────
+def _remember(key: str, value: dict) -> None:
+    _lru[key] = value
+    _lru.move_to_end(key)
+    while len(_lru) > settings.GPT_CACHE_LRU_SIZE:
+        _lru.popitem(last=False)
+
+
+async def get(key: str) -> dict | None:
+    if key in _lru:
+        _lru.move_to_end(key)
+        GPT_CACHE_LOOKUPS.inc(result="lru_hit")
+        return _lru[key]
+
+    fresh_from = datetime.utcnow() - timedelta(days=settings.GPT_CACHE_TTL_DAYS)
+    async with get_read_session() as s:
+        row = (
+            await s.exec(
+                select(GptCache.value).where(
+                    (GptCache.key == key) & (GptCache.created_at >= fresh_from)
+                )
+            )
+        ).first()
+    if row is None:
+        GPT_CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    GPT_CACHE_LOOKUPS.inc(result="db_hit")
+    value = json.loads(row)
+    _remember(key, value)
+    return value
+
+
+async def put(key: str, kind: str, value: dict) -> None:
+    global _writes
+    _remember(key, value)
+
+    stmt = sqlite_insert(GptCache).values(
+        key=key, kind=kind, value=json.dumps(value, ensure_ascii=False),
+        created_at=datetime.utcnow(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[GptCache.key],
+        set_={"value": stmt.excluded.value, "created_at": stmt.excluded.created_at},
+    )
+    async with get_async_session() as s:
+        await s.exec(stmt)
+        _writes += 1
+        if _writes % PRUNE_EVERY == 0:
+            await _prune(s)
+        await s.commit()
+
+
+async def _prune(s) -> None:
+    """Удаляет просроченные записи и самые старые сверх GPT_CACHE_MAX_ROWS."""
+    expired = datetime.utcnow() - timedelta(days=settings.GPT_CACHE_TTL_DAYS)
+    await s.exec(delete(GptCache).where(GptCache.created_at < expired))
+
+    total = (await s.exec(select(func.count()).select_from(GptCache))).one()
+    extra = total - settings.GPT_CACHE_MAX_ROWS
+    if extra > 0:
+        oldest = select(GptCache.key).order_by(GptCache.created_at).limit(extra)
+        await s.exec(delete(GptCache).where(GptCache.key.in_(oldest)))
@@ -1,40 +1,159 @@
-"""services/gpt_client.py — единая точка работы с OpenAI ChatCompletion"""
+"""services/gpt_client.py — единая точка работы с OpenAI Chat Completions
+
+Один AsyncOpenAI на процесс поверх собственного httpx.AsyncClient
+(общий пул keep-alive соединений, без проблем с proxies у httpx),
+семафор ограничивает число одновременных запросов к модели, у каждого
+вызова свой дедлайн. Все ошибки приводятся к GPTError.
+
+Каждый вызов помечается `op` (meal, workout, ai_help…) и попадает в
+гистограмму bot_gpt_request_seconds с исходом ok/timeout/api (ok —
+модель ответила; разбор JSON в замер не входит).
+"""
 
 from __future__ import annotations
 
 import asyncio
-import openai
-from typing import Any, Mapping
+import json
+from typing import AsyncIterator
+
+import httpx
+from openai import AsyncOpenAI, OpenAIError
 
 from config import settings
+from services.metrics import GPT_SECONDS
 
-openai.api_key = settings.OPENAI_API_KEY
+_http = httpx.AsyncClient(
+    timeout=settings.GPT_TIMEOUT,
+    limits=httpx.Limits(
+        max_connections=settings.GPT_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.GPT_MAX_CONNECTIONS,
+    ),
+)
+client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=_http, max_retries=1)
+_slots = asyncio.Semaphore(settings.GPT_MAX_CONCURRENCY)
 
 
-async def chat_json(prompt: str, temperature: float = 0.2, *, timeout: int | None = None) -> dict | None:
-    """Отправляет `prompt` модели GPT и пытается распарсить JSON-ответ.
+class GPTError(Exception):
+    """Запрос к модели не удался.
 
-    Возвращает dict или None при ошибке.
+    kind: "timeout" — не уложились в дедлайн (включая ожидание слота),
+          "api"     — ошибка OpenAI / сети,
+          "format"  — модель вернула не то, что просили.
     """
-    try:
-        resp = await openai.ChatCompletion.acreate(
-            model=settings.GPT_MODEL,
-            temperature=temperature,
-            timeout=timeout or settings.GPT_TIMEOUT,
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"},
-        )
-        return resp.choices[0].message.json_loads()
-    except Exception:
-        return None
-
-
-async def chat_text(prompt: str, *, temperature: float = 0.6, timeout: int | None = None) -> str:
-    """Отправляет `prompt` и возвращает текстовый ответ модели (str)."""
-    resp = await openai.ChatCompletion.acreate(
-        model=settings.GPT_MODEL,
+
+    def __init__(self, kind: str, message: str):
+        super().__init__(message)
+        self.kind = kind
+
+
+def _messages(system: str | None, user: str) -> list[dict]:
+    msgs = [{"role": "system", "content": system}] if system else []
+    return msgs + [{"role": "user", "content": user}]
+
+
+async def _complete(messages: list[dict], *, op: str, timeout: float | None, **params) -> str:
+    async def call() -> str:
+        async with _slots:
+            resp = await client.chat.completions.create(
+                model=settings.GPT_MODEL, messages=messages, **params
+            )
+        return resp.choices[0].message.content or ""
+
+    deadline = timeout or settings.GPT_TIMEOUT
+    with GPT_SECONDS.time(op=op, outcome="ok") as labels:
+        try:
+            return await asyncio.wait_for(call(), deadline)
+        except asyncio.TimeoutError:
+            labels["outcome"] = "timeout"
+            raise GPTError("timeout", f"нет ответа за {deadline} с") from None
+        except OpenAIError as e:
+            labels["outcome"] = "api"
+            raise GPTError("api", str(e)) from e
+
+
+async def chat_json(
+    user: str,
+    *,
+    system: str | None = None,
+    temperature: float = 0.2,
+    timeout: float | None = None,
+    op: str = "other",
+) -> dict:
+    """Отправляет запрос в JSON-режиме и возвращает распарсенный dict."""
+    raw = await _complete(
+        _messages(system, user),
+        op=op,
+        timeout=timeout,
         temperature=temperature,
-        timeout=timeout or settings.GPT_TIMEOUT,
-        messages=[{"role": "user", "content": prompt}],
+        response_format={"type": "json_object"},
+    )
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise GPTError("format", f"невалидный JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise GPTError("format", "ожидался JSON-объект")
+    return data
+
+
+async def chat_stream(
+    user: str,
+    *,
+    system: str | None = None,
+    temperature: float = 0.6,
+    timeout: float | None = None,
+    op: str = "other",
+) -> AsyncIterator[str]:
+    """Потоковый ответ: отдаёт куски текста по мере генерации.
+
+    Дедлайн покрывает ожидание слота и начало ответа; слот занят,
+    пока поток не дочитан или не отменён. В замер входит весь поток.
+    """
+    deadline = timeout or settings.GPT_TIMEOUT
+    with GPT_SECONDS.time(op=op, outcome="cancelled") as labels:
+        try:
+            await asyncio.wait_for(_slots.acquire(), deadline)
+        except asyncio.TimeoutError:
+            labels["outcome"] = "timeout"
+            raise GPTError("timeout", f"нет свободного слота за {deadline} с") from None
+
+        try:
+            stream = await asyncio.wait_for(
+                client.chat.completions.create(
+                    model=settings.GPT_MODEL,
+                    messages=_messages(system, user),
+                    temperature=temperature,
+                    stream=True,
+                ),
+                deadline,
+            )
+            try:
+                async for chunk in stream:
+                    if chunk.choices and (delta := chunk.choices[0].delta.content):
+                        yield delta
+            finally:
+                await stream.close()
+            labels["outcome"] = "ok"
+        except asyncio.TimeoutError:
+            labels["outcome"] = "timeout"
+            raise GPTError("timeout", f"нет ответа за {deadline} с") from None
+        except OpenAIError as e:
+            labels["outcome"] = "api"
+            raise GPTError("api", str(e)) from e
+        finally:
+            _slots.release()
+
+
+async def chat_text(
+    user: str,
+    *,
+    system: str | None = None,
+    temperature: float = 0.6,
+    timeout: float | None = None,
+    op: str = "other",
+) -> str:
+    """Отправляет запрос и возвращает текстовый ответ модели."""
+    answer = await _complete(
+        _messages(system, user), op=op, timeout=timeout, temperature=temperature
     )
-    return resp.choices[0].message.content.strip()
+    return answer.strip()
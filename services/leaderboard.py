@@ -0,0 +1,119 @@
+"""services/leaderboard.py — рейтинг друзей за сегодня и за неделю
+
+Все показатели для пользователя и всех его друзей считаются одним
+сгруппированным запросом по DailyTotals (МСК-сутки, обновляются при
+каждой записи), вес — скалярными подзапросами по PK (user_id, day).
+Результат кэшируется на LEADERBOARD_TTL секунд: смена периода или
+сортировки в клавиатуре БД не трогает.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import aliased
+from sqlmodel import select
+
+from config import settings
+from models_and_db import get_read_session, DailyTotals, Friend, User
+from services.rollup import day_start_utc, msk_day
+from utils.ttl_cache import TTLCache
+
+WEEK_DAYS = 7
+
+_cache = TTLCache(settings.LEADERBOARD_CACHE_SIZE, settings.LEADERBOARD_TTL)
+
+
+@dataclass(slots=True)
+class LeaderRow:
+    user_id: int
+    name: str
+    day_balance: int
+    week_balance: int
+    day_workouts: int
+    week_workouts: int
+    day_dw: float          # изменение веса, кг
+    week_dw: float
+
+
+def _last_weight(user_id_col, before: date, *, inclusive: bool = False):
+    """Последний известный вес до дня `before` (seek по PK + LIMIT 1)."""
+    dt = aliased(DailyTotals)
+    upper = dt.day <= before if inclusive else dt.day < before
+    return (
+        select(dt.last_weight)
+        .where((dt.user_id == user_id_col) & upper & dt.last_weight.is_not(None))
+        .order_by(dt.day.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def leaderboard_stmt(user_id: int, today: date):
+    week_start = today - timedelta(days=WEEK_DAYS - 1)
+    is_today = DailyTotals.day == today
+    kcal = DailyTotals.kcal_in + DailyTotals.kcal_out
+    members = select(Friend.friend_id).where(Friend.user_id == user_id)
+
+    return (
+        select(
+            User.id,
+            User.username,
+            User.chat_id,
+            User.tdee,
+            func.coalesce(func.sum(case((is_today, kcal), else_=0)), 0),
+            func.coalesce(func.sum(kcal), 0),
+            func.coalesce(func.sum(case((is_today, DailyTotals.workouts_cnt), else_=0)), 0),
+            func.coalesce(func.sum(DailyTotals.workouts_cnt), 0),
+            _last_weight(User.id, today, inclusive=True),
+            _last_weight(User.id, today),
+            _last_weight(User.id, week_start),
+        )
+        .select_from(User)
+        .outerjoin(
+            DailyTotals,
+            (DailyTotals.user_id == User.id)
+            & (DailyTotals.day >= week_start)
+            & (DailyTotals.day <= today),
+        )
+        .where(User.id.in_(members) | (User.id == user_id))
+        .group_by(User.id)
+    )
+
+
+def _delta(now_w: float | None, before_w: float | None) -> float:
+    return round(now_w - before_w, 1) if now_w is not None and before_w is not None else 0.0
+
+
+async def leaderboard(user_id: int) -> list[LeaderRow]:
+    """Пользователь и его друзья; порядок не задан — сортирует вызывающий."""
+    if (rows := _cache.get(user_id)) is not None:
+        return rows
+
+    now = datetime.utcnow()
+    today = msk_day(now)
+    day_part = (now - day_start_utc(today)) / timedelta(days=1)
+
+    async with get_read_session() as s:
+        result = (await s.exec(leaderboard_stmt(user_id, today))).all()
+
+    rows = [
+        LeaderRow(
+            user_id=uid,
+            name=username or str(chat_id),
+            day_balance=int(day_kcal - tdee * day_part),
+            week_balance=int(week_kcal - tdee * (WEEK_DAYS - 1 + day_part)),
+            day_workouts=day_cnt,
+            week_workouts=week_cnt,
+            day_dw=_delta(w_now, w_day),
+            week_dw=_delta(w_now, w_week),
+        )
+        for (
+            uid, username, chat_id, tdee, day_kcal, week_kcal,
+            day_cnt, week_cnt, w_now, w_day, w_week,
+        ) in result
+    ]
+    _cache.put(user_id, rows)
+    return rows
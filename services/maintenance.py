@@ -0,0 +1,244 @@
+"""services/maintenance.py — ночное обслуживание БД маленькими шагами
+
+Раз в сутки (scheduler.py, MAINT_HOUR:MAINT_MINUTE по МСК):
+
+1. raw_text приёмов пищи и тренировок старше RAW_TEXT_KEEP_DAYS уходит
+   пачками по MAINT_BATCH строк в RawTextArchive (zlib-сжатый JSON
+   {id: текст}), в исходной строке остаётся пустая строка. Пачка — это
+   строки с created_at < cutoff по возрастанию id от последней
+   заархивированной: каждый прогон продолжает с места, где остановился
+   прошлый, а свежие строки между старыми просто пропускаются. Бот
+   архив не читает (raw_text нигде не показывается) — пачку при
+   разборе разворачивают вручную: json.loads(zlib.decompress(payload)).
+2. Запросы дружбы старше FRIEND_REQUEST_KEEP_DAYS удаляются (принятые и
+   отклонённые больше не нужны, pending такой давности — брошенные).
+3. PRAGMA incremental_vacuum по MAINT_VACUUM_PAGES страниц возвращает
+   освободившееся место файлу; ANALYZE по одной таблице с analysis_limit.
+
+Каждый шаг — своя короткая транзакция на пишущем соединении, между
+шагами пауза MAINT_PAUSE: апдейты пользователей проходят между ними.
+Весь прогон ограничен MAINT_BUDGET секундами, недоделанное — завтра.
+
+Вручную:
+
+    python -m services.maintenance           # один прогон
+    python -m services.maintenance --vacuum  # полный VACUUM (бот остановлен)
+
+Полный VACUUM нужен один раз для БД, созданной до этой задачи:
+auto_vacuum=INCREMENTAL включается только им.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, update
+from sqlmodel import SQLModel, select
+
+from config import settings
+from models_and_db import (
+    WAL,
+    async_engine,
+    engine,
+    get_async_session,
+    get_read_session,
+    read_engine,
+    FriendRequest,
+    Meal,
+    RawTextArchive,
+    Workout,
+)
+
+log = logging.getLogger(__name__)
+
+ARCHIVED = {"meal": Meal, "workout": Workout}
+ANALYSIS_LIMIT = 1000                    # строк индекса на ANALYZE одной таблицы
+
+
+@dataclass(slots=True)
+class MaintenanceReport:
+    archived: int = 0
+    archive_batches: int = 0
+    friend_requests: int = 0
+    vacuum_pages: int = 0
+    analyzed: int = 0
+    finished: bool = True
+    elapsed: float = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"maintenance: archived={self.archived} in {self.archive_batches} batches "
+            f"friend_requests={self.friend_requests} vacuum_pages={self.vacuum_pages} "
+            f"analyzed={self.analyzed} tables in {self.elapsed:.1f}s"
+            + ("" if self.finished else " (budget exhausted)")
+        )
+
+
+class _Budget:
+    def __init__(self, seconds: float):
+        self.deadline = time.monotonic() + seconds
+
+    async def step(self) -> bool:
+        """Пауза между шагами; False — время вышло."""
+        await asyncio.sleep(settings.MAINT_PAUSE)
+        return time.monotonic() < self.deadline
+
+
+# ─────────────────────── архив raw_text ───────────────────────
+async def _archive_batch(kind: str, after_id: int, cutoff: datetime) -> tuple[int, int, bool]:
+    """Одна пачка старых строк после `after_id`: (последний id, заархивировано, конец)."""
+    model = ARCHIVED[kind]
+    async with get_async_session() as s:
+        rows = (
+            await s.exec(
+                select(model.id, model.raw_text)
+                .where((model.id > after_id) & (model.created_at < cutoff))
+                .order_by(model.id)
+                .limit(settings.MAINT_BATCH)
+            )
+        ).all()
+        texts = {row_id: text for row_id, text in rows if text}
+        if texts:
+            s.add(
+                RawTextArchive(
+                    kind=kind,
+                    first_id=min(texts),
+                    last_id=max(texts),
+                    rows=len(texts),
+                    payload=zlib.compress(json.dumps(texts, ensure_ascii=False).encode(), 9),
+                )
+            )
+            await s.exec(update(model).where(model.id.in_(list(texts))).values(raw_text=""))
+            await s.commit()
+
+    done = len(rows) < settings.MAINT_BATCH
+    return (rows[-1][0] if rows else after_id), len(texts), done
+
+
+async def archive_raw_text(kind: str, report: MaintenanceReport, budget: _Budget) -> bool:
+    cutoff = datetime.utcnow() - timedelta(days=settings.RAW_TEXT_KEEP_DAYS)
+    async with get_read_session() as s:
+        last_id = (
+            await s.exec(select(func.max(RawTextArchive.last_id)).where(RawTextArchive.kind == kind))
+        ).one() or 0
+
+    while True:
+        last_id, archived, done = await _archive_batch(kind, last_id, cutoff)
+        if archived:
+            report.archived += archived
+            report.archive_batches += 1
+        if done:
+            return True
+        if not await budget.step():
+            return False
+
+
+# ─────────────────────── запросы дружбы ───────────────────────
+async def prune_friend_requests(report: MaintenanceReport, budget: _Budget) -> bool:
+    cutoff = datetime.utcnow() - timedelta(days=settings.FRIEND_REQUEST_KEEP_DAYS)
+    stale = (
+        select(FriendRequest.id)
+        .where(FriendRequest.created_at < cutoff)
+        .limit(settings.MAINT_BATCH)
+        .scalar_subquery()
+    )
+    while True:
+        async with get_async_session() as s:
+            result = await s.exec(delete(FriendRequest).where(FriendRequest.id.in_(stale)))
+            await s.commit()
+        report.friend_requests += result.rowcount
+        if result.rowcount < settings.MAINT_BATCH:
+            return True
+        if not await budget.step():
+            return False
+
+
+# ─────────────────────── место и статистика ───────────────────────
+async def incremental_vacuum(report: MaintenanceReport, budget: _Budget) -> bool:
+    async with async_engine.connect() as conn:
+        if (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar() != 2:
+            log.info("auto_vacuum is not INCREMENTAL; run `python -m services.maintenance --vacuum` once")
+            return True
+
+    while True:
+        async with async_engine.connect() as conn:
+            free = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar()
+            if not free:
+                return True
+            step = min(free, settings.MAINT_VACUUM_PAGES)
+            # execute() делает один шаг прагмы = одна страница; executescript
+            # (sqlite3_exec) прогоняет её до конца
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.executescript(f"PRAGMA incremental_vacuum({step})")
+        report.vacuum_pages += step
+        if not await budget.step():
+            return False
+
+
+async def analyze(report: MaintenanceReport, budget: _Budget) -> bool:
+    for table in SQLModel.metadata.sorted_tables:
+        async with async_engine.connect() as conn:
+            await conn.exec_driver_sql(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+            await conn.exec_driver_sql(f'ANALYZE "{table.name}"')
+            await conn.commit()
+        report.analyzed += 1
+        if not await budget.step():
+            return False
+    if WAL:
+        async with async_engine.connect() as conn:
+            await conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    return True
+
+
+# ─────────────────────── прогон ───────────────────────
+async def run_maintenance() -> MaintenanceReport:
+    report = MaintenanceReport()
+    budget = _Budget(settings.MAINT_BUDGET)
+    started = time.monotonic()
+
+    steps = [
+        *(lambda r, b, kind=kind: archive_raw_text(kind, r, b) for kind in ARCHIVED),
+        prune_friend_requests,
+        incremental_vacuum,
+        analyze,
+    ]
+    for step in steps:
+        if not await step(report, budget):
+            report.finished = False
+            break
+
+    report.elapsed = time.monotonic() - started
+    log.info("%s", report)
+    return report
+
+
+def full_vacuum() -> None:
+    """Включает auto_vacuum=INCREMENTAL и пересобирает файл (синхронно, бот остановлен)."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+
+
+async def _run_once() -> MaintenanceReport:
+    try:
+        return await run_maintenance()
+    finally:
+        await async_engine.dispose()
+        await read_engine.dispose()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    if "--vacuum" in sys.argv:
+        full_vacuum()
+        print("VACUUM done, auto_vacuum=INCREMENTAL")
+    else:
+        print(asyncio.run(_run_once()))
@@ -0,0 +1,217 @@
+"""services/metrics.py — счётчики и гистограммы в формате Prometheus
+
+Свой маленький реестр без внешних зависимостей: метрики живут в памяти
+процесса и отдаются текстом (exposition format 0.0.4) на локальном
+HTTP-эндпоинте METRICS_HOST:METRICS_PORT/metrics. При WORKERS > 1
+воркер i слушает METRICS_PORT + i — Prometheus опрашивает каждый и
+суммирует сам.
+
+Сами точки замера — middlewares/metrics.py (хендлеры и запросы к БД),
+services/gpt_client.py (GPT), services/gpt_cache.py (кэш оценок),
+services/stats.py (кэш статистики) и services/broadcast.py (рассылки).
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator
+
+from aiohttp import web
+
+from config import settings
+
+log = logging.getLogger(__name__)
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _num(value: float) -> str:
+    return repr(float(value)) if value != int(value) else f"{int(value)}"
+
+
+# ─────────────────────── метрики ───────────────────────
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.doc = doc
+        self.label_names = labels
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, doc, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {_num(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        doc: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = TIME_BUCKETS,
+    ):
+        super().__init__(name, doc, labels)
+        self.buckets = buckets
+        # по набору меток: [счётчики корзин..., +Inf], сумма
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        if (item := self._values.get(key)) is None:
+            item = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        item[0][bisect_left(self.buckets, value)] += 1
+        item[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[dict[str, str]]:
+        """Замеряет блок; метки можно дописать внутри (например, outcome)."""
+        started = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        item = self._values.get(self._key(labels))
+        return sum(item[0]) if item else 0
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, n in zip((*self.buckets, "+Inf"), counts):
+                cumulative += n
+                le = f'le="{bound if bound == "+Inf" else _num(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_num(total[0])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+REGISTRY: list[_Metric] = []
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# ─────────────────────── метрики бота ───────────────────────
+HANDLER_SECONDS = Histogram(
+    "bot_handler_seconds",
+    "Время хендлера (без outer-middleware).",
+    ("event", "handler", "status"),
+)
+UPDATE_SECONDS = Histogram(
+    "bot_update_seconds",
+    "Полное время обработки апдейта, включая middleware.",
+    ("event", "handler"),
+)
+DB_QUERIES = Histogram(
+    "bot_db_queries_per_update",
+    "SQL-запросов на один апдейт.",
+    ("handler",),
+    buckets=COUNT_BUCKETS,
+)
+DB_SECONDS = Histogram(
+    "bot_db_seconds_per_update",
+    "Суммарное время SQL-запросов на один апдейт.",
+    ("handler",),
+)
+GPT_SECONDS = Histogram(
+    "bot_gpt_request_seconds",
+    "Запросы к OpenAI, включая ожидание слота.",
+    ("op", "outcome"),
+)
+BROADCAST_MESSAGES = Counter(
+    "bot_broadcast_messages_total",
+    "Сообщения рассылок планировщика.",
+    ("job", "result"),
+)
+GPT_CACHE_LOOKUPS = Counter(
+    "bot_gpt_cache_lookups_total",
+    "Поиски в кэше GPT-оценок: lru_hit, db_hit или miss.",
+    ("result",),
+)
+STATS_CACHE_LOOKUPS = Counter(
+    "bot_stats_cache_lookups_total",
+    "Поиски в кэше статистики (services/stats.py): hit или miss.",
+    ("result",),
+)
+BROADCAST_SECONDS = Histogram(
+    "bot_broadcast_seconds",
+    "Длительность одной рассылки.",
+    ("job",),
+)
+
+
+# ─────────────────────── проба апдейта ───────────────────────
+@dataclass(slots=True)
+class UpdateProbe:
+    """Что известно о текущем апдейте; кладёт middlewares/metrics.py."""
+
+    handler: str = "unhandled"
+    queries: int = 0
+    db_seconds: float = 0.0
+
+
+current_probe: ContextVar[UpdateProbe | None] = ContextVar("update_probe", default=None)
+
+
+# ─────────────────────── HTTP ───────────────────────
+async def _handle(_: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_server(port: int, host: str = settings.METRICS_HOST) -> web.AppRunner:
+    """Поднимает /metrics; вернуть runner — чтобы остановить через cleanup()."""
+    app = web.Application()
+    app.router.add_get("/metrics", _handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log.info("Metrics on %s:%s/metrics", host, port)
+    return runner
@@ -0,0 +1,73 @@
+"""services/paging.py — keyset (seek) пагинация для инлайн-клавиатур
+
+Страница задаётся не номером, а ключом крайней строки соседней страницы
+(он кладётся в callback_data): WHERE key > cursor ORDER BY key LIMIT n+1.
+Лишняя (n+1)-я строка говорит, есть ли следующая страница, — без
+COUNT(*) и OFFSET, поэтому любая страница стоит один seek по индексу.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Sequence
+
+from sqlalchemy import tuple_
+
+
+EPOCH = datetime(1970, 1, 1)
+
+
+@dataclass(slots=True)
+class Page:
+    rows: list
+    has_prev: bool
+    has_next: bool
+
+
+async def seek_page(
+    session,
+    stmt,
+    keys: Sequence[Any],
+    cursor: tuple | None = None,
+    *,
+    backward: bool = False,
+    size: int,
+    descending: bool = False,
+) -> Page:
+    """Страница `stmt` в порядке `keys` (descending — по убыванию).
+
+    cursor=None — первая страница; иначе строки после курсора
+    (backward=True — перед ним) в порядке показа.
+    """
+    key = tuple_(*keys) if len(keys) > 1 else keys[0]
+    go_desc = descending != backward            # направление выборки в SQL
+    query = stmt
+    if cursor is not None:
+        bound = tuple(cursor) if len(keys) > 1 else cursor[0]
+        query = query.where(key < bound if go_desc else key > bound)
+
+    order = [k.desc() if go_desc else k.asc() for k in keys]
+    rows = list((await session.exec(query.order_by(*order).limit(size + 1))).all())
+    more = len(rows) > size
+    rows = rows[:size]
+
+    if backward:
+        if not rows:                            # строки до курсора удалены
+            return await seek_page(session, stmt, keys, size=size, descending=descending)
+        rows.reverse()
+        return Page(rows, has_prev=more, has_next=True)
+    if not rows and cursor is not None:         # строки после курсора удалены
+        return await seek_page(session, stmt, keys, size=size, descending=descending)
+    return Page(rows, has_prev=cursor is not None, has_next=more)
+
+
+# ─────────────────────── курсор (created_at, id) ───────────────────────
+def ts_cursor(created_at: datetime, row_id: int) -> str:
+    """Ключ (created_at, id) для callback_data: микросекунды эпохи и id."""
+    return f"{(created_at - EPOCH) // timedelta(microseconds=1)}_{row_id}"
+
+
+def parse_ts_cursor(raw: str) -> tuple[datetime, int]:
+    us, row_id = raw.split("_")
+    return EPOCH + timedelta(microseconds=int(us)), int(row_id)
@@ -0,0 +1,92 @@
+"""services/rollup.py — дневные итоги DailyTotals по московским суткам
+
+`bump()` вызывается хендлерами в той же сессии, что и вставка Meal /
+Workout / Weight, поэтому rollup коммитится атомарно с сырыми данными.
+
+Пересобрать таблицу по сырым данным (например, после ручной правки БД):
+
+    python -m services.rollup
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config import settings
+from migrations import rebuild_daily_totals
+from models_and_db import engine, DailyTotals
+
+TZ_OFFSET = timedelta(hours=settings.TZ_OFFSET_HOURS)
+
+
+# ─────────────────────── сутки ───────────────────────
+def msk_day(dt_utc: datetime) -> date:
+    """naive-UTC → дата по Москве."""
+    return (dt_utc + TZ_OFFSET).date()
+
+
+def day_start_utc(day: date) -> datetime:
+    """МСК-полночь дня `day` в naive-UTC."""
+    return datetime.combine(day, time.min) - TZ_OFFSET
+
+
+def full_days(start: datetime, end: datetime) -> tuple[date, date] | None:
+    """Полные МСК-сутки внутри [start, end] как полуинтервал [first, last).
+
+    Сутки с `end` всегда неполные, хвосты до first и после last
+    считаются по сырым таблицам.
+    """
+    first = msk_day(start)
+    if day_start_utc(first) < start:
+        first += timedelta(days=1)
+    last = msk_day(end)
+    return (first, last) if first < last else None
+
+
+# ─────────────────────── запись ───────────────────────
+async def bump(
+    session: AsyncSession,
+    user_id: int,
+    created_at: datetime,
+    *,
+    kcal_in: int = 0,
+    kcal_out: int = 0,
+    workouts: int = 0,
+    weight: float | None = None,
+) -> None:
+    """UPSERT в dailytotals; commit делает вызывающий хендлер."""
+    stmt = sqlite_insert(DailyTotals).values(
+        user_id=user_id,
+        day=msk_day(created_at),
+        kcal_in=kcal_in,
+        kcal_out=kcal_out,
+        workouts_cnt=workouts,
+        last_weight=weight,
+    )
+    cur, new = DailyTotals.__table__.c, stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[cur.user_id, cur.day],
+        set_={
+            "kcal_in": cur.kcal_in + new.kcal_in,
+            "kcal_out": cur.kcal_out + new.kcal_out,
+            "workouts_cnt": cur.workouts_cnt + new.workouts_cnt,
+            "last_weight": func.coalesce(new.last_weight, cur.last_weight),
+        },
+    )
+    await session.exec(stmt)
+
+
+# ─────────────────────── backfill ───────────────────────
+def backfill() -> None:
+    """Полная пересборка rollup (синхронно, вне event-loop)."""
+    with engine.begin() as conn:
+        rebuild_daily_totals(conn)
+
+
+if __name__ == "__main__":
+    backfill()
+    print("dailytotals rebuilt")
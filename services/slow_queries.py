@@ -0,0 +1,181 @@
+"""services/slow_queries.py — журнал медленных SQL-запросов и топ по формам
+
+Хуки на движках models_and_db замеряют каждый запрос. Дольше
+SLOW_QUERY_MS — пишется WARNING: время, хендлер апдейта (если запрос
+пришёл из него), нормализованный текст, параметры и план SQLite
+(EXPLAIN QUERY PLAN, на том же соединении). Чтобы журнал не забил диск
+под нагрузкой, одна форма запроса логируется не чаще раза в
+SLOW_QUERY_LOG_INTERVAL секунд и всего не больше SLOW_QUERY_LOG_MAX
+записей в минуту; пропущенные считаются и попадают в следующую запись.
+
+Время всех запросов копится по формам (текст без литералов и с
+IN (?, ?, …) → IN (?…)); раз в SLOW_QUERY_REPORT_INTERVAL секунд в лог
+уходит топ-N форм по суммарному времени, и счётчики обнуляются.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import settings
+from services.metrics import current_probe
+
+log = logging.getLogger(__name__)
+
+PARAM_REPR_MAX = 200
+PLAN_PREFIXES = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+_SPACES_RE = re.compile(r"\s+")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def normalize(statement: str) -> str:
+    """Форма запроса: одна строка, литералы и списки параметров свёрнуты."""
+    shape = _SPACES_RE.sub(" ", statement).strip()
+    shape = _LITERAL_RE.sub("?", shape)
+    return _IN_LIST_RE.sub("(?…)", shape)
+
+
+@dataclass(slots=True)
+class ShapeStats:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    slow: int = 0
+
+
+class SlowQueryLog:
+    def __init__(
+        self,
+        threshold_ms: float = settings.SLOW_QUERY_MS,
+        *,
+        log_interval: float = settings.SLOW_QUERY_LOG_INTERVAL,
+        log_max: int = settings.SLOW_QUERY_LOG_MAX,
+        report_interval: float = settings.SLOW_QUERY_REPORT_INTERVAL,
+        top: int = settings.SLOW_QUERY_TOP,
+    ):
+        self.threshold = threshold_ms / 1000
+        self.log_interval = log_interval
+        self.log_max = log_max
+        self.report_interval = report_interval
+        self.top_n = top
+        self.shapes: dict[str, ShapeStats] = {}
+        self.suppressed = 0
+        self._shape_cache: dict[str, str] = {}       # текст SQLAlchemy → форма
+        self._last_logged: dict[str, float] = {}
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._next_report = time.monotonic() + report_interval
+
+    def install(self, *engines: Engine) -> None:
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._before)
+            event.listen(engine, "after_cursor_execute", self._after)
+
+    # ─────────────── хуки ───────────────
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        context._slow_started = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._slow_started
+        if (shape := self._shape_cache.get(statement)) is None:
+            if len(self._shape_cache) > 10_000:
+                self._shape_cache.clear()
+            shape = self._shape_cache[statement] = normalize(statement)
+
+        stats = self.shapes.get(shape)
+        if stats is None:
+            stats = self.shapes[shape] = ShapeStats()
+        stats.count += 1
+        stats.total += elapsed
+        stats.max = max(stats.max, elapsed)
+
+        if self.threshold and elapsed >= self.threshold:
+            stats.slow += 1
+            if self._allow(shape):
+                self._log_slow(conn, statement, parameters, executemany, shape, elapsed)
+            else:
+                self.suppressed += 1
+
+        if self.report_interval and time.monotonic() >= self._next_report:
+            self.report()
+
+    # ─────────────── журнал ───────────────
+    def _allow(self, shape: str) -> bool:
+        now = time.monotonic()
+        if now - self._last_logged.get(shape, -self.log_interval) < self.log_interval:
+            return False
+        if now - self._window_start >= 60:
+            self._window_start, self._window_count = now, 0
+        if self._window_count >= self.log_max:
+            return False
+        self._window_count += 1
+        self._last_logged[shape] = now
+        return True
+
+    def _log_slow(self, conn, statement, parameters, executemany, shape, elapsed) -> None:
+        probe = current_probe.get()
+        plan = "    —" if executemany else self._explain(conn, statement, parameters)
+        params = repr(parameters)
+        if len(params) > PARAM_REPR_MAX:
+            params = params[:PARAM_REPR_MAX] + "…"
+        log.warning(
+            "Slow query %.0f ms [handler=%s, suppressed=%s]\n  %s\n  params: %s\n  plan:\n%s",
+            elapsed * 1000,
+            probe.handler if probe else "-",
+            self.suppressed,
+            shape,
+            params,
+            plan,
+        )
+        self.suppressed = 0
+
+    @staticmethod
+    def _explain(conn, statement: str, parameters) -> str:
+        if not statement.lstrip().upper().startswith(PLAN_PREFIXES):
+            return "    —"
+        try:
+            cursor = conn.connection.cursor()
+            try:
+                cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        except Exception as e:                   # план — не повод ронять запрос
+            return f"    (EXPLAIN failed: {e})"
+        # (id, parent, notused, detail) — отступ по глубине дерева
+        depth = {0: 0}
+        lines = []
+        for row_id, parent, _, detail in rows:
+            depth[row_id] = depth.get(parent, 0) + 1
+            lines.append("  " * (depth[row_id] + 1) + detail)
+        return "\n".join(lines) or "    —"
+
+    # ─────────────── отчёт ───────────────
+    def top(self, n: int | None = None) -> list[tuple[str, ShapeStats]]:
+        """Формы запросов по убыванию суммарного времени."""
+        ranked = sorted(self.shapes.items(), key=lambda item: item[1].total, reverse=True)
+        return ranked[: n or self.top_n]
+
+    def report(self) -> None:
+        """Пишет топ-N в лог и начинает новый период."""
+        self._next_report = time.monotonic() + self.report_interval
+        if not self.shapes:
+            return
+        lines = [
+            f"  {s.total * 1000:9.0f} ms total  {s.count:7} × avg {s.total / s.count * 1000:7.2f}"
+            f"  max {s.max * 1000:7.1f}  slow {s.slow:5}  {shape[:300]}"
+            for shape, s in self.top()
+        ]
+        log.info("Top %s SQL shapes by total time:\n%s", len(lines), "\n".join(lines))
+        self.shapes.clear()
+
+
+slow_log = SlowQueryLog()
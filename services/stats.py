@@ -0,0 +1,226 @@
+"""services/stats.py — подсчёт статистики пользователя за интервал
+
+Все агрегаты (суммы ккал, число тренировок, вес на начало и конец)
+собираются одним SELECT из скалярных подзапросов, популярные типы
+тренировок — вторым. Каждый подзапрос идёт по индексу
+(user_id, created_at), вес «на момент» — с LIMIT 1, без сортировки
+всех взвешиваний.
+
+Полные МСК-сутки внутри интервала берутся из DailyTotals, по сырым
+Meal / Workout читаются только неполные граничные сутки.
+
+Сырые итоги кэшируются по (пользователь, начало интервала): конец
+интервала — «сейчас», а новых строк после расчёта нет, пока хендлеры
+записи не вызвали invalidate_stats(user_id); расчёт, начатый до
+инвалидации, в кэш не попадает (номер инвалидации пользователя
+сверяется до и после запроса). Метаболизм и баланс
+пересчитываются от текущего конца при каждом обращении. Между
+процессами (supervisor.py) инвалидация не ходит — там свежесть
+ограничивает STATS_CACHE_TTL.
+"""
+
+from __future__ import annotations
+
+import itertools
+import time
+from datetime import datetime
+
+from sqlalchemy import func, text
+from sqlmodel import select
+
+from models_and_db import (
+    engine,
+    get_read_session,
+    DailyTotals,
+    User,
+    Workout,
+    Meal,
+    Weight,
+)
+from config import settings
+from services.metrics import STATS_CACHE_LOOKUPS
+from services.rollup import day_start_utc, full_days
+from utils.ttl_cache import TTLCache
+
+# user_id → {(start, with_meals): (monotonic время расчёта, сырые итоги)}
+_cache = TTLCache(settings.STATS_CACHE_USERS, settings.STATS_CACHE_TTL)
+# user_id → номер последней инвалидации; живёт дольше любого запроса
+_invalidations = TTLCache(settings.STATS_CACHE_USERS, settings.STATS_CACHE_TTL)
+_invalidation_seq = itertools.count(1)
+
+
+# ─────────────────────── запросы ───────────────────────
+def _weight_at(user_id: int, moment: datetime):
+    """Последнее взвешивание не позже `moment` (seek по индексу + LIMIT 1)."""
+    return (
+        select(Weight.weight_kg)
+        .where((Weight.user_id == user_id) & (Weight.created_at <= moment))
+        .order_by(Weight.created_at.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def _raw_total(agg, model, user_id: int, segments):
+    """Сумма скалярных подзапросов по сырым отрезкам [lo, hi) / [lo, hi]."""
+    total = None
+    for lo, hi, closed in segments:
+        upper = model.created_at <= hi if closed else model.created_at < hi
+        sub = (
+            select(func.coalesce(agg, 0))
+            .select_from(model)
+            .where((model.user_id == user_id) & (model.created_at >= lo) & upper)
+            .scalar_subquery()
+        )
+        total = sub if total is None else total + sub
+    return total
+
+
+def _rolled_total(col, user_id: int, days):
+    """Сумма колонки DailyTotals по полным суткам [first, last)."""
+    return (
+        select(func.coalesce(func.sum(col), 0))
+        .where(
+            (DailyTotals.user_id == user_id)
+            & (DailyTotals.day >= days[0])
+            & (DailyTotals.day < days[1])
+        )
+        .scalar_subquery()
+    )
+
+
+def aggregates_stmt(user_id: int, start: datetime, end: datetime):
+    """Один SELECT: meals, workouts, workouts_cnt, start_w, end_w."""
+    days = full_days(start, end)
+    if days is None:
+        segments = [(start, end, True)]
+    else:
+        segments = [
+            (start, day_start_utc(days[0]), False),
+            (day_start_utc(days[1]), end, True),
+        ]
+
+    meals = _raw_total(func.sum(Meal.calories), Meal, user_id, segments)
+    workouts = _raw_total(func.sum(Workout.calories), Workout, user_id, segments)
+    workouts_cnt = _raw_total(func.count(), Workout, user_id, segments)
+
+    if days is not None:
+        meals = meals + _rolled_total(DailyTotals.kcal_in, user_id, days)
+        workouts = workouts + _rolled_total(DailyTotals.kcal_out, user_id, days)
+        workouts_cnt = workouts_cnt + _rolled_total(DailyTotals.workouts_cnt, user_id, days)
+
+    return select(
+        meals.label("meals"),
+        workouts.label("workouts"),
+        workouts_cnt.label("workouts_cnt"),
+        _weight_at(user_id, start).label("start_w"),
+        _weight_at(user_id, end).label("end_w"),
+    )
+
+
+def popular_stmt(user_id: int, start: datetime, end: datetime):
+    return (
+        select(Workout.type, func.count())
+        .where((Workout.user_id == user_id) & Workout.created_at.between(start, end))
+        .group_by(Workout.type)
+        .order_by(func.count().desc())
+    )
+
+
+def meal_rows_stmt(user_id: int, start: datetime, end: datetime):
+    """(id, created_at, description, calories) приёмов пищи; порядок задаёт вызывающий."""
+    return select(Meal.id, Meal.created_at, Meal.description, Meal.calories).where(
+        (Meal.user_id == user_id) & Meal.created_at.between(start, end)
+    )
+
+
+# ──────────────────────── расчёт ────────────────────────
+def invalidate_stats(user_id: int) -> None:
+    """Вызывается после записи Meal / Workout / Weight / Checkpoint пользователя."""
+    _cache.pop(user_id)
+    _invalidations.put(user_id, next(_invalidation_seq))
+
+
+async def _raw_stats(user_id: int, start: datetime, end: datetime, with_meals: bool) -> tuple:
+    entries = _cache.get(user_id)
+    key = (start, with_meals)
+    if entries is not None and key in entries:
+        computed_at, raw = entries[key]
+        if time.monotonic() - computed_at < settings.STATS_CACHE_TTL:
+            entries[key] = entries.pop(key)        # недавно нужный — в конец, вытесняется последним
+            STATS_CACHE_LOOKUPS.inc(result="hit")
+            return raw
+    STATS_CACHE_LOOKUPS.inc(result="miss")
+    seen = _invalidations.get(user_id, 0)
+
+    async with get_read_session() as s:
+        agg = (await s.exec(aggregates_stmt(user_id, start, end))).one()
+        rows = (await s.exec(popular_stmt(user_id, start, end))).all()
+        meal_rows = (
+            (await s.exec(meal_rows_stmt(user_id, start, end).order_by(Meal.created_at))).all()
+            if with_meals
+            else []
+        )
+    raw = (tuple(agg), [tuple(r) for r in rows], [tuple(m) for m in meal_rows])
+
+    if _invalidations.get(user_id, 0) != seen:
+        return raw                              # во время запроса была запись — не кэшируем
+    entries = _cache.get(user_id) or {}
+    entries.pop(key, None)
+    entries[key] = (time.monotonic(), raw)
+    while len(entries) > settings.STATS_CACHE_PER_USER:
+        del entries[next(iter(entries))]        # давно не нужный интервал
+    _cache.put(user_id, entries)                # TTL и место в LRU — от последнего расчёта
+    return raw
+
+
+async def calc_stats(
+    user: User, start: datetime, end: datetime, *, with_meals: bool = False
+) -> dict:
+    """with_meals=True — ещё и строки приёмов пищи (для коротких интервалов)."""
+    delta_days = (end - start).total_seconds() / 86400
+    agg, rows, meal_rows = await _raw_stats(user.id, start, end, with_meals)
+
+    meals_sum, workouts_sum, workouts_cnt, start_w, end_w = agg
+    popular = [f"{r[0]} ({r[1]})" for r in rows]
+
+    delta_w = (
+        round(end_w - start_w, 1)
+        if (start_w is not None and end_w is not None)
+        else 0.0
+    )
+    metab = int(user.tdee * delta_days)
+    balance = meals_sum + workouts_sum - metab
+
+    return {
+        "delta_w": delta_w,
+        "start_w": start_w if start_w is not None else "—",
+        "end_w": end_w if end_w is not None else "—",
+        "meals": meals_sum,
+        "workouts": workouts_sum,
+        "metab": -metab,
+        "balance": balance,
+        "workouts_cnt": workouts_cnt,
+        "popular": popular,
+        "meal_rows": meal_rows,  # (id, created_at, description, calories), если with_meals
+    }
+
+
+# ───────────────────── EXPLAIN-проверка ─────────────────────
+def explain_stats_plan(user_id: int, start: datetime, end: datetime) -> list[str]:
+    """Возвращает строки EXPLAIN QUERY PLAN для запросов calc_stats.
+
+    Используется при ревью индексов: в каждой строке SEARCH должен
+    фигурировать ix_*_user_created, а не SCAN всей таблицы.
+    """
+    plan: list[str] = []
+    with engine.connect() as conn:
+        for stmt in (
+            aggregates_stmt(user_id, start, end),
+            popular_stmt(user_id, start, end),
+            meal_rows_stmt(user_id, start, end).order_by(Meal.created_at, Meal.id),
+        ):
+            compiled = stmt.compile(engine, compile_kwargs={"literal_binds": True})
+            rows = conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+            plan.extend(r[-1] for r in rows)
+    return plan
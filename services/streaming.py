@@ -0,0 +1,101 @@
+"""services/streaming.py — потоковый вывод ответа в одно сообщение Telegram
+
+Текст копится по мере прихода кусков и не чаще раза в
+STREAM_EDIT_INTERVAL секунд выводится через edit_text (Telegram режет
+частые правки одного чата). В конце — финальная правка полным ответом.
+
+Активные потоки регистрируются по chat_id, чтобы «🏠 Меню» мог их
+остановить через cancel(). Генератор кусков закрывается сразу при
+отмене (aclosing): HTTP-поток и слот GPT не ждут сборщика мусора.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import html
+import logging
+import time
+from contextlib import aclosing
+from typing import AsyncGenerator, Coroutine
+
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from config import settings
+
+log = logging.getLogger(__name__)
+
+PART = 3500            # символов на сообщение: запас до 4096 под HTML-экранирование
+CURSOR = " ▌"
+
+_active: dict[int, asyncio.Task] = {}
+
+
+# ─────────────────────── реестр ───────────────────────
+def start(chat_id: int, coro: Coroutine) -> asyncio.Task:
+    """Запускает поток для чата в фоне; предыдущий поток этого чата отменяется.
+
+    Хендлер не ждёт задачу: ссылку держит реестр, ошибки пишутся в лог.
+    """
+    cancel(chat_id)
+    task = asyncio.create_task(coro)
+    _active[chat_id] = task
+
+    def forget(t: asyncio.Task) -> None:
+        if _active.get(chat_id) is t:
+            del _active[chat_id]
+        if not t.cancelled() and (exc := t.exception()) is not None:
+            log.error("Stream for chat %s failed", chat_id, exc_info=exc)
+
+    task.add_done_callback(forget)
+    return task
+
+
+def cancel(chat_id: int) -> bool:
+    task = _active.pop(chat_id, None)
+    if task is None or task.done():
+        return False
+    task.cancel()
+    return True
+
+
+# ─────────────────────── вывод ───────────────────────
+async def _edit(message: types.Message, text: str, markup) -> float:
+    """Правит сообщение; возвращает паузу до следующей правки (RetryAfter)."""
+    try:
+        await message.edit_text(html.escape(text), reply_markup=markup)
+    except TelegramRetryAfter as e:
+        return e.retry_after
+    except TelegramBadRequest:
+        pass                                    # «message is not modified»
+    return 0.0
+
+
+async def stream_to_message(
+    message: types.Message,
+    chunks: AsyncGenerator[str, None],
+    *,
+    reply_markup: types.InlineKeyboardMarkup | None = None,
+    interval: float = settings.STREAM_EDIT_INTERVAL,
+) -> str:
+    """Выводит поток в `message`, возвращает полный текст ответа."""
+    text = ""
+    shown = ""
+    next_edit = time.monotonic() + interval / 2   # первый кусок — побыстрее
+
+    async with aclosing(chunks):
+        async for piece in chunks:
+            text += piece
+            now = time.monotonic()
+            if now >= next_edit and text.strip()[:PART] != shown:
+                shown = text.strip()[:PART]
+                pause = await _edit(message, shown + CURSOR, reply_markup)
+                next_edit = time.monotonic() + max(interval, pause)
+
+    answer = text.strip() or "🤷 Пустой ответ, попробуй переформулировать вопрос."
+    # финальная правка: первая часть в placeholder, остаток — новыми сообщениями
+    while (pause := await _edit(message, answer[:PART], reply_markup)) > 0:
+        await asyncio.sleep(pause)
+    for i in range(PART, len(answer), PART):
+        await message.answer(html.escape(answer[i : i + PART]), reply_markup=reply_markup)
+    return answer
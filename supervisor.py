@@ -0,0 +1,205 @@
+# supervisor.py — несколько процессов-воркеров с шардингом апдейтов по chat_id
+#
+# Супервизор только принимает апдейты (long-polling сырым getUpdates или
+# webhook из webhook.py), достаёт chat_id и отдаёт JSON-словарь воркеру
+# chat_id % WORKERS через multiprocessing-очередь. Разбор в модели aiogram,
+# ORM и рендеринг идут в воркерах — каждый на своём ядре. Чат всегда
+# попадает в один и тот же процесс, поэтому кэши пользователя и FSM
+# (services/fsm_storage.py) в нём авторитетны, а апдейты одного чата не
+# обрабатываются двумя процессами одновременно. Внутри воркера UpdatePool
+# с key=chat_id_of разбирает апдейты чата по одному, в порядке прихода.
+#
+# Планировщик (scheduler.py) и регистрация команд — только в воркере 0.
+
+import asyncio
+import logging
+import multiprocessing as mp
+import queue
+import signal
+from typing import Any, Callable
+
+import aiohttp
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.telegram import PRODUCTION
+from aiogram.enums import ParseMode
+from aiohttp import web
+
+from config import settings
+from webhook import UpdatePool, make_app, webhook_secret
+
+log = logging.getLogger(__name__)
+
+POLL_TIMEOUT = 30        # секунд long-poll getUpdates
+
+
+def default_bot() -> Bot:
+    return Bot(
+        token=settings.BOT_TOKEN,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+
+
+def chat_id_of(update: dict[str, Any]) -> int:
+    """chat_id апдейта (для inline-запросов и т.п. — id отправителя)."""
+    for key, event in update.items():
+        if not isinstance(event, dict):
+            continue
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        if sender := event.get("from") or event.get("user"):
+            return sender["id"]
+    return 0
+
+
+def shard_of(update: dict[str, Any], workers: int) -> int:
+    return chat_id_of(update) % workers
+
+
+# ─────────────────────── воркер ───────────────────────
+def run_worker(index: int, inbox: mp.Queue, make_bot: Callable[[], Bot] = default_bot) -> None:
+    """Точка входа процесса-воркера: разбирает свои апдейты до sentinel None."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)    # останавливает супервизор
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s [%(levelname)s] w{index} %(name)s: %(message)s",
+    )
+    asyncio.run(_worker(index, inbox, make_bot))
+
+
+async def _worker(index: int, inbox: mp.Queue, make_bot: Callable[[], Bot]) -> None:
+    from main import build_dispatcher
+
+    bot = make_bot()
+    # у каждого воркера свой реестр метрик → свой порт /metrics
+    port = settings.METRICS_PORT and settings.METRICS_PORT + index
+    dp = build_dispatcher(scheduler=index == 0, metrics_port=port)
+    workflow_data = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+    await dp.emit_startup(bot=bot, **workflow_data)
+
+    pool = UpdatePool(bot, dp, key=chat_id_of)   # апдейты чата — по одному, по порядку
+    pool.start()
+    loop = asyncio.get_running_loop()
+    try:
+        while (update := await loop.run_in_executor(None, inbox.get)) is not None:
+            await pool.queue.put(update)          # полна → не читаем inbox дальше
+    finally:
+        await pool.drain()
+        try:
+            await dp.emit_shutdown(bot=bot, **workflow_data)
+        finally:
+            await bot.session.close()
+
+
+# ─────────────────────── супервизор ───────────────────────
+class ShardRouter:
+    """Раздаёт апдейты по очередям воркеров; интерфейс как у UpdatePool."""
+
+    def __init__(self, inboxes: list[mp.Queue]):
+        self.inboxes = inboxes
+
+    def offer(self, update: dict[str, Any]) -> bool:
+        try:
+            self.inboxes[shard_of(update, len(self.inboxes))].put_nowait(update)
+        except queue.Full:
+            return False
+        return True
+
+    async def put(self, update: dict[str, Any]) -> None:
+        """Как offer, но ждёт места в очереди воркера."""
+        inbox = self.inboxes[shard_of(update, len(self.inboxes))]
+        try:
+            inbox.put_nowait(update)
+        except queue.Full:
+            await asyncio.get_running_loop().run_in_executor(None, inbox.put, update)
+
+
+async def _poll(router: ShardRouter, allowed: list[str]) -> None:
+    """Сырой getUpdates: JSON не превращается в модели в супервизоре."""
+    url = PRODUCTION.api_url(settings.BOT_TOKEN, "getUpdates")
+    offset = None
+    async with aiohttp.ClientSession() as http:
+        await http.post(PRODUCTION.api_url(settings.BOT_TOKEN, "deleteWebhook"))
+        try:
+            while True:
+                try:
+                    async with http.post(
+                        url,
+                        json={"offset": offset, "timeout": POLL_TIMEOUT, "allowed_updates": allowed},
+                        timeout=aiohttp.ClientTimeout(total=POLL_TIMEOUT + 10),
+                    ) as resp:
+                        body = await resp.json()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    log.warning("getUpdates failed: %s", e)
+                    await asyncio.sleep(1)
+                    continue
+                if not body.get("ok"):
+                    log.warning("getUpdates: %s", body.get("description"))
+                    await asyncio.sleep((body.get("parameters") or {}).get("retry_after", 1))
+                    continue
+                for update in body["result"]:
+                    await router.put(update)
+                    offset = update["update_id"] + 1
+        finally:
+            # подтверждаем отданное воркерам, иначе после рестарта придёт повторно
+            if offset is not None:
+                await http.post(url, json={"offset": offset, "timeout": 0, "limit": 1})
+
+
+async def _serve_webhook(router: ShardRouter, allowed: list[str]) -> None:
+    runner = web.AppRunner(make_app(router))
+    await runner.setup()
+    await web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT).start()
+    bot = default_bot()
+    try:
+        await bot.set_webhook(
+            settings.WEBHOOK_URL.rstrip("/") + settings.WEBHOOK_PATH,
+            secret_token=webhook_secret(),
+            allowed_updates=allowed,
+            max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+        )
+    finally:
+        await bot.session.close()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()                  # новых запросов больше нет
+
+
+async def supervise(workers: int = settings.WORKERS) -> None:
+    """Запускает воркеров и приём апдейтов; возвращается после SIGINT/SIGTERM."""
+    from main import build_dispatcher
+
+    # заодно миграции БД выполняются здесь, до старта воркеров
+    allowed = build_dispatcher(scheduler=False, metrics_port=0).resolve_used_update_types()
+
+    ctx = mp.get_context("spawn")
+    inboxes = [ctx.Queue(settings.WEBHOOK_QUEUE) for _ in range(workers)]
+    procs = [
+        ctx.Process(target=run_worker, args=(i, inbox), name=f"bot-worker-{i}")
+        for i, inbox in enumerate(inboxes)
+    ]
+    for proc in procs:
+        proc.start()
+    log.info("Supervisor: %s workers, mode %s", workers, settings.RUN_MODE)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    intake = _serve_webhook if settings.RUN_MODE == "webhook" else _poll
+    task = asyncio.create_task(intake(ShardRouter(inboxes), allowed))
+    await stop.wait()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    # дообработка: sentinel в каждую очередь, ждём воркеров
+    for inbox in inboxes:
+        await loop.run_in_executor(None, inbox.put, None)
+    for proc in procs:
+        await loop.run_in_executor(None, proc.join, settings.WEBHOOK_DRAIN_TIMEOUT + 5)
+        if proc.is_alive():
+            log.warning("%s did not stop, terminating", proc.name)
+            proc.terminate()
@@ -0,0 +1,20 @@
+"""tests/conftest.py — окружение для тестов: фиктивные секреты и временная БД
+
+models_and_db и config читают окружение при импорте, поэтому всё
+выставляется здесь, до того как тесты импортируют модули бота.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+_tmp = tempfile.mkdtemp(prefix="fitbot_tests_")
+os.environ.setdefault("BOT_TOKEN", "0:test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["DB_PATH"] = str(Path(_tmp) / "test.db")
+os.environ["SLOW_QUERY_MS"] = "0"
+os.environ["METRICS_PORT"] = "0"
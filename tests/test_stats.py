@@ -0,0 +1,215 @@
+"""tests/test_stats.py — calc_stats против наивных запросов и план EXPLAIN
+
+Сверяет итоги calc_stats (один SELECT + DailyTotals за полные сутки) с
+отдельными SUM / COUNT по сырым таблицам за тот же интервал и
+проверяет, что план идёт по индексам (user_id, created_at) и ключу
+dailytotals, без SCAN сырых таблиц.
+"""
+
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from models_and_db import (
+    async_engine,
+    engine,
+    init_db,
+    read_engine,
+    Meal,
+    User,
+    Weight,
+    Workout,
+)
+from services import stats
+from services.metrics import STATS_CACHE_LOOKUPS
+from services.rollup import backfill, day_start_utc, msk_day
+
+END = datetime(2026, 3, 15, 13, 37, 11)        # середина МСК-суток
+MIDNIGHT = day_start_utc(msk_day(END))         # МСК-полночь тех же суток
+HISTORY_DAYS = 120
+
+
+def _run(coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await async_engine.dispose()
+            await read_engine.dispose()
+
+    return asyncio.run(main())
+
+
+def _new_user(s: Session, chat_id: int) -> User:
+    user = User(
+        chat_id=chat_id, age=30, height_cm=180, weight_kg=80.0,
+        gender="Мужской", bmi=24.7, tdee=2500,
+    )
+    s.add(user)
+    s.flush()
+    return user
+
+
+@pytest.fixture(scope="module")
+def users() -> tuple[User, User]:
+    """Пользователь с историей за HISTORY_DAYS и «соседом» для проверки фильтра."""
+    init_db()
+    rng = random.Random(7)
+    with Session(engine, expire_on_commit=False) as s:
+        user, other = _new_user(s, 1), _new_user(s, 2)
+        first = END - timedelta(days=HISTORY_DAYS)
+
+        moments = [first + timedelta(minutes=rng.randrange(HISTORY_DAYS * 1440 + 2880))
+                   for _ in range(3000)]
+        # ровно на границах: МСК-полночи, начала интервалов и END
+        moments += [day_start_utc(msk_day(END) - timedelta(days=d)) for d in range(HISTORY_DAYS)]
+        moments += [END - timedelta(days=d) for d in (0, 1, 7, 90)]
+        moments += [MIDNIGHT - timedelta(days=d) for d in (0, 1, 7, 90)]
+
+        for i, at in enumerate(moments):
+            owner = other if i % 10 == 0 else user
+            if i % 3 == 0:
+                s.add(Workout(
+                    user_id=owner.id, created_at=at, raw_text="", method="user",
+                    type=rng.choice(["Бег", "Плавание", "Йога"]),
+                    duration_min=30, calories=-rng.randint(50, 600),
+                ))
+            else:
+                s.add(Meal(
+                    user_id=owner.id, created_at=at, raw_text="",
+                    description="еда", calories=rng.randint(50, 900),
+                ))
+            if i % 25 == 0:
+                s.add(Weight(user_id=owner.id, created_at=at, weight_kg=round(rng.uniform(70, 90), 1)))
+        s.commit()
+    backfill()
+    return user, other
+
+
+def _naive(user_id: int, start: datetime, end: datetime) -> dict:
+    """Итоги интервала отдельными запросами по сырым таблицам."""
+    def in_range(model):
+        return (model.user_id == user_id) & model.created_at.between(start, end)
+
+    def weight_at(moment):
+        return s.exec(
+            select(Weight.weight_kg)
+            .where((Weight.user_id == user_id) & (Weight.created_at <= moment))
+            .order_by(Weight.created_at.desc())
+            .limit(1)
+        ).first()
+
+    with Session(engine) as s:
+        start_w, end_w = weight_at(start), weight_at(end)
+        return {
+            "meals": s.exec(select(func.coalesce(func.sum(Meal.calories), 0)).where(in_range(Meal))).one(),
+            "workouts": s.exec(select(func.coalesce(func.sum(Workout.calories), 0)).where(in_range(Workout))).one(),
+            "workouts_cnt": s.exec(select(func.count()).select_from(Workout).where(in_range(Workout))).one(),
+            "start_w": start_w if start_w is not None else "—",
+            "end_w": end_w if end_w is not None else "—",
+            "popular": sorted(
+                f"{t} ({n})"
+                for t, n in s.exec(select(Workout.type, func.count()).where(in_range(Workout)).group_by(Workout.type))
+            ),
+        }
+
+
+@pytest.mark.parametrize("end", [END, MIDNIGHT], ids=["mid-day", "midnight"])
+@pytest.mark.parametrize(
+    "span",
+    [timedelta(days=1), timedelta(days=7), timedelta(days=90), timedelta(days=90, hours=5, minutes=3)],
+    ids=["1d", "7d", "90d", "90d-ragged"],
+)
+def test_calc_stats_matches_naive(users, end, span):
+    user, _ = users
+    start = end - span
+    stats.invalidate_stats(user.id)
+    got = _run(stats.calc_stats(user, start, end))
+    expected = _naive(user.id, start, end)
+
+    assert got["workouts_cnt"] > 0                 # интервал не пустой
+    for key in ("meals", "workouts", "workouts_cnt", "start_w", "end_w"):
+        assert got[key] == expected[key], key
+    assert sorted(got["popular"]) == expected["popular"]
+
+
+def test_calc_stats_boundary_rows(users):
+    """Строки ровно на start/end входят, а граничные сутки не считаются дважды."""
+    user, _ = users
+    start = day_start_utc(msk_day(END) - timedelta(days=7))
+    for lo, hi in [(start, END), (start, MIDNIGHT), (start + timedelta(microseconds=1), END)]:
+        stats.invalidate_stats(user.id)
+        got = _run(stats.calc_stats(user, lo, hi))
+        expected = _naive(user.id, lo, hi)
+        assert (got["meals"], got["workouts"], got["workouts_cnt"]) == (
+            expected["meals"], expected["workouts"], expected["workouts_cnt"]
+        )
+
+
+def test_stats_plan_uses_indexes(users):
+    user, _ = users
+    plan = stats.explain_stats_plan(user.id, END - timedelta(days=90), END)
+
+    for table in ("meal", "workout", "weight"):
+        assert any(
+            line.startswith(f"SEARCH {table} ") and f"ix_{table}_user_created" in line
+            for line in plan
+        ), table
+        assert not any(line.startswith(f"SCAN {table}") for line in plan), table
+    assert any(
+        line.startswith("SEARCH dailytotals ")
+        and ("sqlite_autoindex_dailytotals" in line or "PRIMARY KEY" in line)
+        for line in plan
+    )
+
+
+def test_stats_cache_ttl_per_interval(users, monkeypatch):
+    """Интервал живёт STATS_CACHE_TTL от своего расчёта, а не от первого у пользователя."""
+    user, _ = users
+    now = [1000.0]
+    monkeypatch.setattr(stats.time, "monotonic", lambda: now[0])
+    ttl = stats.settings.STATS_CACHE_TTL
+    day, week = END - timedelta(days=1), END - timedelta(days=7)
+
+    stats.invalidate_stats(user.id)
+    _run(stats.calc_stats(user, day, END))
+    now[0] += ttl * 0.9
+    _run(stats.calc_stats(user, week, END))
+    now[0] += ttl * 0.2                            # day просрочен, week — нет
+
+    hits, misses = _lookups()
+    _run(stats.calc_stats(user, week, END))
+    assert _lookups() == (hits + 1, misses)
+    _run(stats.calc_stats(user, day, END))
+    assert _lookups() == (hits + 1, misses + 1)
+
+    stats.invalidate_stats(user.id)
+    _run(stats.calc_stats(user, week, END))
+    assert _lookups() == (hits + 1, misses + 2)
+
+
+def test_stats_cache_skips_result_of_invalidated_read(users, monkeypatch):
+    """Запись во время расчёта: старые итоги не остаются в кэше."""
+    user, _ = users
+    stats.invalidate_stats(user.id)
+    real = stats.aggregates_stmt
+
+    def write_during_read(*args):
+        stats.invalidate_stats(user.id)            # хендлер записи закоммитил посреди чтения
+        return real(*args)
+
+    monkeypatch.setattr(stats, "aggregates_stmt", write_during_read)
+    _run(stats.calc_stats(user, END - timedelta(days=7), END))
+    monkeypatch.setattr(stats, "aggregates_stmt", real)
+
+    hits, misses = _lookups()
+    _run(stats.calc_stats(user, END - timedelta(days=7), END))
+    assert _lookups() == (hits, misses + 1)
+
+
+def _lookups() -> tuple[float, float]:
+    return STATS_CACHE_LOOKUPS.value(result="hit"), STATS_CACHE_LOOKUPS.value(result="miss")
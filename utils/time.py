@@ -1,6 +1,8 @@
 """utils/time.py — вспомогательные функции времени (МСК / UTC)"""
 
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
 from config import settings
 
 MOSCOW_TZ = timezone(timedelta(hours=settings.TZ_OFFSET_HOURS))
@@ -18,3 +20,20 @@ def to_msk(dt: datetime) -> datetime:
 def from_msk(dt: datetime) -> datetime:
     """Принимает dt в МСК, отдаёт UTC-время для хранения."""
     return dt.replace(tzinfo=MOSCOW_TZ).astimezone(timezone.utc)
+
+
+def utc_minute_of_day(tz_name: str, local_min: int, day: datetime | None = None) -> int:
+    """Минута суток по UTC, в которую наступает `local_min` в поясе `tz_name`.
+
+    Считается на дату `day` (по умолчанию — сегодня), поэтому после
+    перехода на летнее/зимнее время значение нужно пересчитать.
+    """
+    tz = ZoneInfo(tz_name)
+    base = (day or datetime.now(tz)).astimezone(tz)
+    local = datetime.combine(base.date(), time(local_min // 60, local_min % 60), tzinfo=tz)
+    at_utc = local.astimezone(timezone.utc)
+    return at_utc.hour * 60 + at_utc.minute
+
+
+def hhmm(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
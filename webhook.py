@@ -0,0 +1,166 @@
+# webhook.py — приём апдейтов через webhook (встроенный aiohttp-сервер)
+#
+# Telegram шлёт апдейты POST-запросами параллельно. Хендлер запроса только
+# проверяет секрет, кладёт апдейт в ограниченную очередь и сразу отвечает
+# 200; обработку ведут WEBHOOK_WORKERS задач. Очередь полна → 503, и
+# Telegram повторит доставку позже. При остановке сервер перестаёт
+# принимать запросы, а очередь дорабатывается (не дольше
+# WEBHOOK_DRAIN_TIMEOUT секунд).
+#
+# С key (воркеры supervisor.py передают chat_id_of) апдейты одного ключа
+# разбираются строго по очереди и в порядке прихода: воркер ждёт lock
+# чата, остальные чаты идут параллельно.
+
+import asyncio
+import hashlib
+import hmac
+import logging
+import signal
+from typing import Any, Callable
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+from config import settings
+
+log = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def webhook_secret() -> str:
+    """WEBHOOK_SECRET либо производный от токена (A-Z a-z 0-9, как требует API)."""
+    return settings.WEBHOOK_SECRET or hashlib.sha256(settings.BOT_TOKEN.encode()).hexdigest()
+
+
+# ─────────────────────── пул обработчиков ───────────────────────
+class UpdatePool:
+    """Ограниченная очередь апдейтов + фиксированное число воркеров."""
+
+    def __init__(
+        self,
+        bot: Bot,
+        dp: Dispatcher,
+        *,
+        workers: int = settings.WEBHOOK_WORKERS,
+        maxsize: int = settings.WEBHOOK_QUEUE,
+        key: Callable[[dict[str, Any]], int] | None = None,
+    ):
+        self.bot = bot
+        self.dp = dp
+        self.workers = workers
+        self.key = key
+        self.queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize)
+        self._tasks: list[asyncio.Task] = []
+        self._locks: dict[int, list] = {}        # ключ → [Lock, сколько воркеров его ждут]
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def offer(self, update: dict[str, Any]) -> bool:
+        """Ставит апдейт в очередь; False — очередь полна."""
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            update = await self.queue.get()
+            try:
+                # между get() и захватом lock нет await: кто раньше взял
+                # апдейт из очереди, тот раньше встал в очередь lock (FIFO)
+                key = self.key(update) if self.key else None
+                if key:
+                    await self._feed_locked(key, update)
+                else:
+                    await self._feed(update)
+            finally:
+                self.queue.task_done()
+
+    async def _feed_locked(self, key: int, update: dict[str, Any]) -> None:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await self._feed(update)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def _feed(self, update: dict[str, Any]) -> None:
+        try:
+            await self.dp.feed_raw_update(self.bot, update)
+        except Exception:
+            log.exception("Update %s failed", update.get("update_id"))
+
+    async def drain(self, timeout: float = settings.WEBHOOK_DRAIN_TIMEOUT) -> None:
+        """Дожидается разбора очереди, затем останавливает воркеров."""
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            log.warning("Drain timeout: %s updates dropped", self.queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+# ─────────────────────── aiohttp ───────────────────────
+def make_app(pool: UpdatePool) -> web.Application:
+    """pool — всё, у чего есть offer(update) -> bool (UpdatePool, supervisor.ShardRouter)."""
+    secret = webhook_secret()
+
+    async def handle(request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            return web.Response(status=401)
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        if not pool.offer(update):
+            return web.Response(status=503)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(settings.WEBHOOK_PATH, handle)
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher) -> None:
+    """Запускает сервер и регистрирует webhook; возвращается после SIGINT/SIGTERM."""
+    workflow_data = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+    await dp.emit_startup(bot=bot, **workflow_data)
+
+    pool = UpdatePool(bot, dp)
+    pool.start()
+    runner = web.AppRunner(make_app(pool))
+    await runner.setup()
+    site = web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT)
+    await site.start()
+
+    await bot.set_webhook(
+        settings.WEBHOOK_URL.rstrip("/") + settings.WEBHOOK_PATH,
+        secret_token=webhook_secret(),
+        allowed_updates=dp.resolve_used_update_types(),
+        max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+    )
+    log.info("Webhook on %s:%s%s", settings.WEBHOOK_HOST, settings.WEBHOOK_PORT, settings.WEBHOOK_PATH)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        # webhook не снимаем: пока бот лежит, Telegram копит апдейты у себя
+        await runner.cleanup()                  # новых запросов больше нет
+        await pool.drain()
+        try:
+            await dp.emit_shutdown(bot=bot, **workflow_data)
+        finally:
+            await bot.session.close()